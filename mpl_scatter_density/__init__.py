@@ -1,4 +1,5 @@
 from .scatter_density_artist import *  # noqa
+from .segment_density_artist import *  # noqa
 from .scatter_density_axes import *  # noqa
 
 try:
@@ -6,6 +6,9 @@ from matplotlib.image import AxesImage
 from matplotlib.transforms import (IdentityTransform, TransformedBbox,
                                    BboxTransformFrom, Bbox)
 
+from .sparse import SparseDensity
+from .timers import Debouncer, new_timer
+
 __all__ = ['BaseImageArtist', 'supports_resize']
 
 EMPTY_IMAGE = np.array([[np.nan]])
@@ -16,6 +19,10 @@ SUPPORTS_RESIZE = ('FigureCanvasTk', 'FigureCanvasQT')
 
 def supports_resize(canvas):
 
+    # Note that this is no longer used internally since resize events are now
+    # debounced for all canvases with a working timer, but is kept for
+    # backward-compatibility.
+    #
     # We check whether the canvas supports resizing by using the name of the
     # class and its parents rather than checking with isinstance, since the
     # latter requires importing the relevant canvas classes which could then
@@ -45,11 +52,21 @@ class BaseImageArtist(AxesImage):
         histogram - this should take the arguments ``bins`` and ``range`` as
         defined by :func:`~numpy.histogram2d` as well as a ``pressed`` keyword
         argument that indicates whether the user is currently panning/zooming.
+        If the callable has a ``version`` attribute, it should change whenever
+        the underlying data changes, and the computation is then skipped when
+        neither the version nor the bins/range have changed since the last
+        draw. The function can also return a
+        :class:`~mpl_scatter_density.sparse.SparseDensity` instance.
+    export_dpi : int or `None`
+        The number of dots per inch to use for the density map when saving to
+        vector formats such as PDF or SVG. If `None`, the same resolution as
+        for other devices is used.
     kwargs
         Any additional keyword arguments are passed to AxesImage.
     """
 
-    def __init__(self, ax, dpi=72, array_func=None, update_while_panning=True, **kwargs):
+    def __init__(self, ax, dpi=72, array_func=None, update_while_panning=True,
+                 export_dpi=None, **kwargs):
 
         super(BaseImageArtist, self).__init__(ax, **kwargs)
 
@@ -58,6 +75,20 @@ class BaseImageArtist(AxesImage):
         self._make_image_called = False
         self._pressed = False
 
+        # Keep track of the inputs to the last call to _array_func so that
+        # we can avoid re-computing the array if nothing has changed. We keep
+        # separate arrays for vector and raster outputs since these can have
+        # different resolutions, which means that e.g. saving to PDF does not
+        # invalidate the array shown on screen.
+        self._last_arrays = {}
+        self._compute_count = 0
+        self._skip_count = 0
+
+        # For vector outputs, we also keep the last image, since returning
+        # the same image object allows e.g. the PDF backend to only embed
+        # the image once in multi-page files.
+        self._last_vector_image = None
+
         self._ax = ax
         self._ax.figure.canvas.mpl_connect('button_press_event', self.on_press)
         self._ax.figure.canvas.mpl_connect('button_release_event', self.on_release)
@@ -65,37 +96,43 @@ class BaseImageArtist(AxesImage):
         self._update_while_panning = update_while_panning
 
         self.set_dpi(dpi)
+        self.set_export_dpi(export_dpi)
 
         self.on_release()
         self.set_array(EMPTY_IMAGE)
 
-        # Not all backends support timers properly, so we explicitly whitelist
-        # backends for which they do. In these cases, we avoid recomputing the
-        # density map during resizing.
-        if supports_resize(self._ax.figure.canvas):
-            self._ax.figure.canvas.mpl_connect('resize_event', self._resize_start)
-            self._timer = self._ax.figure.canvas.new_timer(interval=500)
-            self._timer.single_shot = True
-            self._timer.add_callback(self._resize_end)
+        # When resizing the figure, we show a low-resolution density map, and
+        # only compute the map at full resolution once the resize events
+        # stop. This requires a timer that calls back from the event loop, so
+        # canvases without a working timer (which are not interactive) always
+        # compute the map at full resolution.
+        timer = new_timer(self._ax.figure.canvas, 500)
+        if timer is None:
+            self._debouncer = None
         else:
-            self._timer = None
+            self._debouncer = Debouncer(timer, self._interaction_end)
+            self._ax.figure.canvas.mpl_connect('resize_event', self._interaction_start)
 
-    def _resize_start(self, event=None):
-        if not self._make_image_called:
+    def _interaction_start(self, event=None):
+        if not self._make_image_called or self._debouncer is None:
             # Only handle resizing once the map has been shown at least once
             # to avoid 'blinking' at the start.
             return
         self.on_press(force=True)
-        self._timer.start()
+        self._debouncer()
 
-    def _resize_end(self, event=None):
+    def _interaction_end(self, event=None):
+        if self._debouncer is None:  # pragma: nocover
+            return
         self.on_release()
-        self.stale = True
-        self._ax.figure.canvas.draw()
+        self._ax.figure.canvas.draw_idle()
 
     def set_dpi(self, dpi):
         self._dpi = dpi
 
+    def set_export_dpi(self, export_dpi):
+        self._export_dpi = export_dpi
+
     def on_press(self, event=None, force=False):
         if not force:
             try:
@@ -104,12 +141,29 @@ class BaseImageArtist(AxesImage):
                 return
             if mode != 'pan/zoom':
                 return
-        self._pressed = True
-        self.stale = True
+        if not self._pressed:
+            self._pressed = True
+            self.stale = True
 
     def on_release(self, event=None):
-        self._pressed = False
-        self.stale = True
+        if self._pressed:
+            self._pressed = False
+            self.stale = True
+
+    @property
+    def compute_count(self):
+        """
+        The number of times the array was computed when drawing the artist.
+        """
+        return self._compute_count
+
+    @property
+    def skip_count(self):
+        """
+        The number of times the computation of the array was skipped when
+        drawing the artist because none of its inputs had changed.
+        """
+        return self._skip_count
 
     def get_extent(self):
 
@@ -142,15 +196,22 @@ class BaseImageArtist(AxesImage):
 
         return bbox + self._ax.transAxes
 
-    def make_image(self, *args, **kwargs):
+    def make_image(self, renderer, magnification=1.0, unsampled=False):
 
         if not self._update_while_panning and self._pressed:
-            return super(BaseImageArtist, self).make_image(*args, **kwargs)
+            return super(BaseImageArtist, self).make_image(renderer, magnification=magnification,
+                                                           unsampled=unsampled)
 
         xmin, xmax = self._ax.get_xlim()
         ymin, ymax = self._ax.get_ylim()
 
-        if self._dpi is None:
+        # Renderers that can transform images are the vector ones (e.g. PDF,
+        # SVG, and PS)
+        vector = renderer.option_scale_image()
+
+        if vector and self._export_dpi is not None:
+            dpi = self._export_dpi
+        elif self._dpi is None:
             dpi = self.axes.figure.get_dpi()
         else:
             dpi = self._dpi
@@ -174,30 +235,77 @@ class BaseImageArtist(AxesImage):
 
         bins = (ny, nx)
 
-        array = self._array_func(bins=bins, range=((ymin, ymax), (xmin, xmax)))
+        # If the array function exposes a version attribute that changes
+        # whenever its data changes, we can skip the computation if none of
+        # the inputs have changed since the last call. Functions without a
+        # version may return different results for the same inputs so we
+        # always call them.
+        version = getattr(self._array_func, 'version', None)
 
-        if flip_x or flip_y:
-            if flip_x and flip_y:
-                array = array[::-1, ::-1]
-            elif flip_x:
-                array = array[:, ::-1]
-            else:
-                array = array[::-1, :]
+        if version is None:
+            key = None
+        else:
+            key = (bins, (ymin, ymax), (xmin, xmax),
+                   self._ax.get_xscale(), self._ax.get_yscale(),
+                   self._pressed, version)
 
-        if self.origin == 'upper':
-            array = np.flipud(array)
+        if key is not None and self._last_arrays.get(vector, (None,))[0] == key:
+            array = self._last_arrays[vector][1]
+            self._skip_count += 1
+        else:
+            array = self._array_func(bins=bins, range=((ymin, ymax), (xmin, xmax)))
+            self._last_arrays[vector] = key, array
+            self._compute_count += 1
+
+        if isinstance(array, SparseDensity):
+            if self.origin == 'upper':
+                flip_y = not flip_y
+            if flip_x or flip_y:
+                array = array.flip(x=flip_x, y=flip_y)
+        else:
+            if flip_x or flip_y:
+                if flip_x and flip_y:
+                    array = array[::-1, ::-1]
+                elif flip_x:
+                    array = array[:, ::-1]
+                else:
+                    array = array[::-1, :]
+
+            if self.origin == 'upper':
+                array = np.flipud(array)
 
         self.set_data(array)
 
         self._make_image_called = True
 
-        return super(BaseImageArtist, self).make_image(*args, **kwargs)
+        if vector and key is not None:
+            # Re-use the previous image if none of the settings that affect
+            # the output have changed.
+            image_key = (key, magnification, unsampled, self.origin,
+                         self.norm.vmin, self.norm.vmax, self.norm, self.cmap,
+                         self.get_alpha(), self.get_interpolation(),
+                         tuple(self.get_transform().get_matrix().ravel()),
+                         tuple(self.axes.bbox.bounds))
+            if self._last_vector_image is not None and self._last_vector_image[0] == image_key:
+                return self._last_vector_image[1]
+        else:
+            image_key = None
+
+        image = super(BaseImageArtist, self).make_image(renderer, magnification=magnification,
+                                                        unsampled=unsampled)
+
+        if image_key is not None:
+            self._last_vector_image = image_key, image
+
+        return image
 
     def remove(self):
-        if self._timer is not None:
-            self._timer.stop()
-            self._timer = None
+        if self._debouncer is not None:
+            self._debouncer.stop()
+            self._debouncer = None
         super(BaseImageArtist, self).remove()
         # We explicitly clean up the reference to the _array_func function since
         # this may in some cases cause circular references.
         self._array_func = None
+        self._last_arrays = {}
+        self._last_vector_image = None
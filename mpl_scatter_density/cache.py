@@ -0,0 +1,101 @@
+import os
+import uuid
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+__all__ = ['hash_array', 'DensityCache']
+
+
+# The number of bytes hashed at once by each thread
+CHUNK_SIZE = 2 ** 24
+
+
+def _chunk_hash():
+    # xxhash is much faster than blake2b, so we use it if it is installed
+    try:
+        import xxhash
+    except ImportError:
+        return lambda data: hashlib.blake2b(data, digest_size=16).digest()
+    else:
+        return lambda data: xxhash.xxh3_128_digest(data)
+
+
+def hash_array(array):
+    """
+    Compute a hash of the contents of an array.
+
+    The hash covers every byte of the array, in order, as well as its dtype
+    and shape. To make this fast for large arrays, the array is split into
+    chunks that are hashed in parallel by several threads (hashlib and
+    xxhash release the GIL), and the final hash is computed from the hashes
+    of the chunks.
+    """
+    array = np.ascontiguousarray(array)
+    flat = array.reshape(-1).view(np.uint8)
+    chunk_hash = _chunk_hash()
+    chunks = [flat[start:start + CHUNK_SIZE] for start in range(0, flat.size, CHUNK_SIZE)]
+    if len(chunks) > 1:
+        with ThreadPoolExecutor(max_workers=min(len(chunks), os.cpu_count() or 1)) as executor:
+            digests = list(executor.map(chunk_hash, chunks))
+    else:
+        digests = [chunk_hash(chunk) for chunk in chunks]
+    h = hashlib.blake2b(digest_size=16)
+    h.update(str(array.dtype).encode('ascii'))
+    h.update(str(array.shape).encode('ascii'))
+    for digest in digests:
+        h.update(digest)
+    return h.hexdigest()
+
+
+class DensityCache:
+    """
+    On-disk cache of arrays derived from the input data.
+
+    Arrays are stored as ``.npy`` files inside a sub-directory named after
+    the content hash of the array they were derived from, and are
+    memory-mapped when loaded so that warm starts do not need to read the
+    whole file into memory.
+
+    Parameters
+    ----------
+    directory : str
+        The directory in which to store the cached arrays. This is created
+        if it does not exist.
+    """
+
+    def __init__(self, directory):
+        self.directory = str(directory)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _filename(self, key, name):
+        return os.path.join(self.directory, key, name + '.npy')
+
+    def load(self, key, name):
+        """
+        Return the memory-mapped array for ``key`` and ``name``, or `None`
+        if it has not been cached yet.
+        """
+        filename = self._filename(key, name)
+        if not os.path.exists(filename):
+            return None
+        try:
+            return np.load(filename, mmap_mode='r')
+        except (OSError, ValueError):  # pragma: nocover
+            # Treat corrupted or truncated files as cache misses
+            return None
+
+    def save(self, key, name, array):
+        """
+        Save ``array`` to the cache, and return a memory-mapped version of it.
+        """
+        filename = self._filename(key, name)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        # Write to a temporary file first and then rename it, so that other
+        # processes never see partially written files.
+        tmp_filename = '{0}.{1}.tmp'.format(filename, uuid.uuid4().hex)
+        with open(tmp_filename, 'wb') as f:
+            np.save(f, np.asanyarray(array))
+        os.replace(tmp_filename, filename)
+        return np.load(filename, mmap_mode='r')
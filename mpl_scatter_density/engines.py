@@ -0,0 +1,203 @@
+"""
+Engines used to bin points into pixels.
+
+Each engine provides two methods, which should give identical results for
+all engines:
+
+* ``histogram2d(x, y, bins, range, weights=None)``, which returns the
+  (optionally weighted) 2D histogram of the points, with ``y`` along the
+  first dimension, following the conventions of
+  :func:`fast_histogram.histogram2d`.
+
+* ``bin_index(x, y, bins, range)``, which returns the flat pixel index of
+  each point, as described in :func:`~mpl_scatter_density.reducers.bin_index`.
+"""
+
+from importlib.util import find_spec
+
+import numpy as np
+
+from .reducers import bin_index
+
+__all__ = ['FastHistogramEngine', 'NumbaEngine', 'ENGINES', 'get_engine',
+           'NUMBA_THRESHOLD', 'MAX_PARTIAL_SIZE']
+
+# The number of points above which the numba engine is used by default, if
+# available. Below this, the overhead of starting threads is not worth it.
+NUMBA_THRESHOLD = 1000000
+
+# The maximum total number of elements in the per-thread histograms used by
+# the numba engine, which limits the temporary memory used for large images
+# (each element uses 8 bytes).
+MAX_PARTIAL_SIZE = 2 ** 22
+
+
+class FastHistogramEngine:
+    """
+    Binning engine using the fast-histogram package.
+    """
+
+    name = 'fast_histogram'
+
+    @staticmethod
+    def is_available():
+        return True
+
+    def histogram2d(self, x, y, bins, range, weights=None):
+        # We import fast_histogram on-the-fly to keep the import of this
+        # package fast.
+        from fast_histogram import histogram2d
+        return histogram2d(y, x, bins=bins, range=range, weights=weights)
+
+    def bin_index(self, x, y, bins, range):
+        return bin_index(x, y, bins, range)
+
+
+_NUMBA_KERNELS = None
+
+
+def _numba_kernels():
+
+    # Compile the kernels the first time they are needed, which avoids
+    # importing numba unless this engine is used.
+
+    global _NUMBA_KERNELS
+
+    if _NUMBA_KERNELS is not None:
+        return _NUMBA_KERNELS
+
+    from numba import njit, prange
+
+    # Note that the expressions used to find the pixel of each point below
+    # are deliberately written in the same way as in fast-histogram to make
+    # sure that the results are identical, including at the edges of pixels.
+
+    @njit(parallel=True, nogil=True, cache=True)
+    def histogram2d_kernel(x, y, weights, use_weights, xmin, normx, ymin, normy,
+                           nx, ny, nchunks):
+        n = x.shape[0]
+        partial = np.zeros((nchunks, ny * nx))
+        chunk_size = (n + nchunks - 1) // nchunks
+        for ichunk in prange(nchunks):
+            start = ichunk * chunk_size
+            end = min(n, start + chunk_size)
+            for i in range(start, end):
+                tx = (x[i] - xmin) * normx
+                ty = (y[i] - ymin) * normy
+                if tx >= 0 and tx < nx and ty >= 0 and ty < ny:
+                    if use_weights:
+                        partial[ichunk, int(ty) * nx + int(tx)] += weights[i]
+                    else:
+                        partial[ichunk, int(ty) * nx + int(tx)] += 1.
+        return partial
+
+    @njit(parallel=True, nogil=True, cache=True)
+    def bin_index_kernel(x, y, xmin, normx, ymin, normy, nx, ny, index):
+        for i in prange(x.shape[0]):
+            tx = (x[i] - xmin) * normx
+            ty = (y[i] - ymin) * normy
+            if tx >= 0 and tx < nx and ty >= 0 and ty < ny:
+                index[i] = int(ty) * nx + int(tx)
+            else:
+                index[i] = nx * ny
+
+    _NUMBA_KERNELS = histogram2d_kernel, bin_index_kernel
+
+    return _NUMBA_KERNELS
+
+
+class NumbaEngine:
+    """
+    Multi-threaded binning engine using JIT-compiled kernels from numba.
+
+    This requires the optional numba dependency. The kernels are compiled
+    the first time they are used and cached on disk.
+    """
+
+    name = 'numba'
+
+    @staticmethod
+    def is_available():
+        # We avoid importing numba here since this is slow
+        return find_spec('numba') is not None
+
+    @staticmethod
+    def _as_float(values):
+        # The kernels are compiled separately for 32- and 64-bit floats, so
+        # we only convert other types - this avoids copying the data (e.g.
+        # the log10 of the coordinates in compact mode) every time.
+        values = np.asarray(values)
+        if values.dtype not in (np.float32, np.float64):
+            values = values.astype(float)
+        return values
+
+    @classmethod
+    def _prepare(cls, x, y, bins, range):
+        ny, nx = bins
+        (ymin, ymax), (xmin, xmax) = range
+        x = cls._as_float(x)
+        y = cls._as_float(y)
+        return (x, y, float(xmin), nx / (xmax - xmin), float(ymin), ny / (ymax - ymin),
+                int(nx), int(ny))
+
+    def histogram2d(self, x, y, bins, range, weights=None):
+        from numba import get_num_threads
+        histogram2d_kernel, _ = _numba_kernels()
+        x, y, xmin, normx, ymin, normy, nx, ny = self._prepare(x, y, bins, range)
+        if weights is None:
+            use_weights = False
+            weights = x
+        else:
+            use_weights = True
+            weights = self._as_float(weights)
+        # Each chunk is binned into its own histogram, so we limit the number
+        # of chunks for large images to bound the temporary memory used.
+        nchunks = max(1, min(get_num_threads(), len(x) // 100000,
+                             MAX_PARTIAL_SIZE // (nx * ny)))
+        partial = histogram2d_kernel(x, y, weights, use_weights, xmin, normx,
+                                     ymin, normy, nx, ny, nchunks)
+        return partial.sum(axis=0).reshape((ny, nx))
+
+    def bin_index(self, x, y, bins, range):
+        _, bin_index_kernel = _numba_kernels()
+        x, y, xmin, normx, ymin, normy, nx, ny = self._prepare(x, y, bins, range)
+        index = np.empty(len(x), dtype=np.intp)
+        bin_index_kernel(x, y, xmin, normx, ymin, normy, nx, ny, index)
+        return index
+
+
+ENGINES = {'fast_histogram': FastHistogramEngine,
+           'numba': NumbaEngine}
+
+
+def get_engine(engine='auto', size=None):
+    """
+    Return the binning engine to use.
+
+    Parameters
+    ----------
+    engine : str or object
+        The name of the engine (``'fast_histogram'`` or ``'numba'``), an
+        engine instance, or ``'auto'`` to select the numba engine for
+        ``size`` of at least `NUMBA_THRESHOLD` points if it is available, and
+        the fast-histogram engine otherwise. Note that the numba kernels are
+        compiled the first time they are used, which takes a few seconds,
+        and are then cached on disk.
+    size : int, optional
+        The number of points to bin, used when ``engine='auto'``.
+    """
+    if engine == 'auto':
+        if size is not None and size >= NUMBA_THRESHOLD and NumbaEngine.is_available():
+            engine = 'numba'
+        else:
+            engine = 'fast_histogram'
+    if isinstance(engine, str):
+        try:
+            cls = ENGINES[engine]
+        except KeyError:
+            raise ValueError('engine should be one of: auto, {0}'
+                             .format(', '.join(sorted(ENGINES))))
+        if not cls.is_available():
+            raise ImportError('The {0} engine is not available'.format(engine))
+        return cls()
+    return engine
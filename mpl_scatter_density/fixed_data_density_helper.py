@@ -2,25 +2,89 @@ from math import log10
 
 import numpy as np
 
-from fast_histogram import histogram2d
+from .cache import DensityCache, hash_array
+from .engines import get_engine
+from .geometry import get_geometry
+from .memory import nbytes, track
+from .reducers import get_reducer, reduce_count, reduce_sum
+from .selection import polygon_mask, rectangle_mask
+from .sparse import SparseDensity
+
+
+def _log10(values):
+    with np.errstate(invalid='ignore'):
+        return np.log10(values)
+
+
+def _log10_float32(values):
+    with np.errstate(invalid='ignore'):
+        return np.log10(values, dtype=np.float32)
+
+
+def _bounds(values):
+    return np.array([np.min(values), np.max(values)])
 
 
 class FixedDataDensityHelper:
 
     compute_when_pressed = True
 
-    def __init__(self, ax, x, y, c=None, downres_factor=4):
+    # Structures reported by memory_usage that can't be evicted
+    non_evictable = ()
+
+    def __init__(self, ax, x, y, c=None, downres_factor=4, cache_dir=None,
+                 reduce='mean', cache_indices=False, engine='auto', geometry=None,
+                 compact=False, sparse=False, dtype=None):
+
+        # The version is incremented every time the data changes, and is used
+        # by BaseImageArtist to avoid recomputing unchanged density maps.
+        self.version = 0
 
         self._ax = ax
         self._c = None
+        self._column = None
+        self._column_arrays = None
         self._downres = False
 
+        # If requested, we keep the flat pixel index of each point for the
+        # last bins/range, so that changing only the values of c just
+        # requires a bincount over these indices.
+        self._cache_indices = cache_indices
+        self._index_cache = None
+
+        # In compact mode, the log10 of the coordinates are stored as 32-bit
+        # floats, which halves the memory they use.
+        self._compact = compact
+
+        # The density maps can optionally be returned as sparse arrays and/or
+        # with a smaller dtype to save memory for large images.
+        self._sparse = sparse
+        self._dtype = dtype
+
+        # Check the engine straight away so that invalid names are caught early
+        get_engine(engine)
+        self._engine = engine
+
+        self.set_geometry(geometry)
+
         if downres_factor < 1 or downres_factor % 1 != 0:
             raise ValueError('downres_factor should be a strictly positive integer value')
 
         self._downres_factor = downres_factor
+
+        if cache_dir is None:
+            self._cache = None
+        else:
+            self._cache = DensityCache(cache_dir)
+
         self.set_xy(x, y)
         self.set_c(c)
+        self.set_reduce(reduce)
+
+        # Check the dtype straight away so that invalid combinations are
+        # caught early - this is checked again when computing the maps since
+        # c, reduce and the geometry can change.
+        self._check_dtype()
 
     def downres(self):
         self._downres = True
@@ -29,56 +93,205 @@ class FixedDataDensityHelper:
         self._downres = False
 
     def set_xy(self, x, y):
+        self.version += 1
+        self._column_arrays = None
+        self._index_cache = None
         self._x = x
         self._y = y
         self._x_log = None
         self._y_log = None
         self._x_log_sub = None
         self._y_log_sub = None
+        self._x_key = None
+        self._y_key = None
+        self._bounds = None
         step = self._downres_factor ** 2
         self._x_sub = self._x[::step]
         self._y_sub = self._y[::step]
 
     def set_c(self, c):
-        self._c = c
+        self.version += 1
+        self._column_arrays = None
         step = self._downres_factor ** 2
+        if isinstance(c, dict) or np.ndim(c) == 2:
+            # Several columns of values are binned in a single pass, and
+            # select_column can then be used to choose which one is shown.
+            if isinstance(c, dict):
+                self._columns = dict(c)
+            else:
+                c = np.asarray(c)
+                self._columns = {i: c[:, i] for i in range(c.shape[1])}
+            self._columns_sub = {key: values[::step]
+                                 for key, values in self._columns.items()}
+            if self._column not in self._columns:
+                self._column = next(iter(self._columns))
+            self._c = self._columns[self._column]
+        else:
+            self._columns = None
+            self._columns_sub = None
+            self._c = c
         if self._c is None:
             self._c_sub = None
         else:
             self._c_sub = self._c[::step]
 
+    def select_column(self, key):
+        """
+        Select which of the columns of ``c`` to show.
+
+        Switching columns does not require re-binning the data since all
+        columns are binned at the same time.
+        """
+        if self._columns is None:
+            raise ValueError('select_column can only be used when c contains '
+                             'several columns')
+        if key not in self._columns:
+            raise KeyError('Unknown column: {0!r}'.format(key))
+        self.version += 1
+        self._column = key
+        self._c = self._columns[key]
+        self._c_sub = self._columns_sub[key]
+
+    def set_geometry(self, geometry):
+        """
+        Set the geometry of the cells - this can be `None` for rectangular
+        pixels, ``'hex'`` or ``'polar'``, or an instance of one of the classes
+        in :mod:`mpl_scatter_density.geometry`.
+        """
+        self.version += 1
+        self._geometry = get_geometry(geometry)
+
+    def set_reduce(self, reduce):
+        self.version += 1
+        self._column_arrays = None
+        self._reduce = reduce
+        self._reducer = get_reducer(reduce)
+
+    @property
+    def index_cache_nbytes(self):
+        """
+        The number of bytes used by the cached pixel indices.
+        """
+        if self._index_cache is None:
+            return 0
+        return nbytes(self._index_cache[1])
+
+    def memory_usage(self):
+        """
+        Return a dictionary giving the number of bytes held in memory by each
+        of the structures derived from the data. Apart from the ones listed
+        in :attr:`non_evictable`, these can be evicted with :meth:`evict`
+        and are recomputed when needed.
+        """
+        usage = {'x_log': nbytes(self._x_log),
+                 'y_log': nbytes(self._y_log),
+                 'index_cache': self.index_cache_nbytes,
+                 'column_arrays': 0}
+        if self._column_arrays is not None:
+            usage['column_arrays'] = sum(nbytes(array)
+                                         for array in self._column_arrays[1].values())
+        return usage
+
+    def evict(self, name):
+        """
+        Discard one of the structures listed by :meth:`memory_usage`.
+        """
+        if name == 'x_log':
+            self._x_log = self._x_log_sub = None
+        elif name == 'y_log':
+            self._y_log = self._y_log_sub = None
+        elif name == 'index_cache':
+            self._index_cache = None
+        elif name == 'column_arrays':
+            self._column_arrays = None
+        elif name in self.non_evictable:
+            raise ValueError('{0!r} cannot be evicted'.format(name))
+        else:
+            raise KeyError('Unknown structure: {0!r}'.format(name))
+
+    def _view_key(self):
+        # The arrays that are binned are uniquely determined by the scales and
+        # whether we are in downres mode, so we use these in cache keys.
+        return self._ax.get_xscale(), self._ax.get_yscale(), self._downres
+
+    def _bin_index(self, engine, x, y, bins, range):
+        key = (bins, range) + self._view_key()
+        if self._index_cache is not None and self._index_cache[0] == key:
+            return self._index_cache[1]
+        index = engine.bin_index(x, y, bins=bins, range=range)
+        if self._cache_indices:
+            if bins[0] * bins[1] < 2 ** 31:
+                index = index.astype(np.int32)
+            self._index_cache = key, index
+        return index
+
+    def _cache_key(self, coord):
+        attr = '_{0}_key'.format(coord)
+        if getattr(self, attr) is None:
+            # Hashing is only done on demand since it requires a full pass
+            # over the data.
+            setattr(self, attr, hash_array(getattr(self, '_' + coord)))
+        return getattr(self, attr)
+
+    def _derived(self, coord, name, func):
+        # Compute an array derived from the x or y values, using the on-disk
+        # cache (if enabled) to avoid recomputing it across processes.
+        values = getattr(self, '_' + coord)
+        if self._cache is None:
+            return func(values)
+        key = self._cache_key(coord)
+        array = self._cache.load(key, name)
+        if array is None:
+            array = self._cache.save(key, name, func(values))
+        return array
+
+    def get_bounds(self):
+        """
+        Return the ``(xmin, xmax, ymin, ymax)`` bounds of the data.
+        """
+        if self._bounds is None:
+            # The bounds are cheaper to compute than the hash of the data, so
+            # we don't use the on-disk cache for them.
+            xmin, xmax = _bounds(self._x)
+            ymin, ymax = _bounds(self._y)
+            self._bounds = xmin, xmax, ymin, ymax
+        return self._bounds
+
+    def _log10(self, coord):
+        if self._compact:
+            return self._derived(coord, 'log10_float32', _log10_float32)
+        else:
+            return self._derived(coord, 'log10', _log10)
+
     def _update_x_log(self):
         step = self._downres_factor ** 2
-        with np.errstate(invalid='ignore'):
-            self._x_log = np.log10(self._x)
+        self._x_log = self._log10('x')
         self._x_log_sub = self._x_log[::step]
 
     def _update_y_log(self):
         step = self._downres_factor ** 2
-        with np.errstate(invalid='ignore'):
-            self._y_log = np.log10(self._y)
+        self._y_log = self._log10('y')
         self._y_log_sub = self._y_log[::step]
 
-    def __call__(self, bins=None, range=None):
+    def _coordinates(self, downres=False):
 
-        ny, nx = bins
-        (ymin, ymax), (xmin, xmax) = range
+        # Return the coordinates of the points in the space in which the
+        # binning is done, which is the log10 of the values for log axes.
 
         xscale = self._ax.get_xscale()
         yscale = self._ax.get_yscale()
 
         if xscale == 'log':
-            xmin, xmax = log10(xmin), log10(xmax)
             if self._x_log is None:
                 # We do this here insead of in set_xy to save time since in
                 # set_xy we don't know yet if the axes will be log or not.
                 self._update_x_log()
-            if self._downres:
+            if downres:
                 x = self._x_log_sub
             else:
                 x = self._x_log
         elif xscale == 'linear':
-            if self._downres:
+            if downres:
                 x = self._x_sub
             else:
                 x = self._x
@@ -86,42 +299,219 @@ class FixedDataDensityHelper:
             raise ValueError('Unexpected xscale: {0}'.format(xscale))
 
         if yscale == 'log':
-            ymin, ymax = log10(ymin), log10(ymax)
             if self._y_log is None:
                 # We do this here insead of in set_xy to save time since in
                 # set_xy we don't know yet if the axes will be log or not.
                 self._update_y_log()
-            if self._downres:
+            if downres:
                 y = self._y_log_sub
             else:
                 y = self._y_log
         elif yscale == 'linear':
-            if self._downres:
+            if downres:
                 y = self._y_sub
             else:
                 y = self._y
         else:  # pragma: nocover
-            raise ValueError('Unexpected xscale: {0}'.format(xscale))
+            raise ValueError('Unexpected yscale: {0}'.format(yscale))
 
-        if self._downres:
+        return x, y
+
+    def _scale_limits(self, xmin, xmax, ymin, ymax):
+        if self._ax.get_xscale() == 'log':
+            xmin, xmax = log10(xmin), log10(xmax)
+        if self._ax.get_yscale() == 'log':
+            ymin, ymax = log10(ymin), log10(ymax)
+        return xmin, xmax, ymin, ymax
+
+    def __call__(self, bins=None, range=None):
+
+        ny, nx = bins
+        (ymin, ymax), (xmin, xmax) = range
+
+        # We read the resolution mode once so that the coordinates, values
+        # and bins are always consistent with each other.
+        downres = self._downres
+
+        x, y = self._coordinates(downres=downres)
+        xmin, xmax, ymin, ymax = self._scale_limits(xmin, xmax, ymin, ymax)
+
+        if downres:
             nx_sub = nx // self._downres_factor
             ny_sub = ny // self._downres_factor
             bins = (ny_sub, nx_sub)
             weights = self._c_sub
+            columns = self._columns_sub
         else:
             bins = (ny, nx)
             weights = self._c
+            columns = self._columns
 
-        if weights is None:
-            array = histogram2d(y, x, bins=bins,
-                                range=((ymin, ymax), (xmin, xmax)))
+        array = self._compute(x, y, weights, columns, bins, ((ymin, ymax), (xmin, xmax)))
+
+        # We only enforce the memory budget once the array has been computed
+        # since the structures used above might otherwise get evicted while
+        # they are still needed.
+        track(self)
+
+        # The maps are computed as 64-bit floats, and are only converted
+        # at the end, which saves memory for the arrays that are kept but
+        # not while binning.
+        if self._dtype is not None:
+            self._check_dtype()
+            array = array.astype(self._dtype, copy=False)
+
+        if self._sparse:
+            array = SparseDensity.from_array(array)
+
+        return array
+
+    def _holds_counts(self):
+        # Whether the density maps only contain exact counts, which can't be
+        # NaN. Note that the estimates from 'count_distinct' are fractional.
+        return self._geometry is None and (self._c is None or self._reduce == 'count')
+
+    def _check_dtype(self):
+        if (self._dtype is not None and np.issubdtype(self._dtype, np.integer) and
+                not self._holds_counts()):
+            raise ValueError('Integer dtypes can only be used for density maps '
+                             'containing counts, since other maps can contain NaN '
+                             'or fractional values (c should not be set, or reduce '
+                             "should be 'count', and geometry should not be set)")
+
+    def _selection_result(self, mask, count):
+        track(self)
+        if count:
+            return int(np.count_nonzero(mask))
+        else:
+            return np.flatnonzero(mask)
+
+    def _pixel_index(self, engine, x, y, bins, range):
+        # The cached pixel indices, if any, can only be re-used if they were
+        # computed for the full resolution data.
+        if self._downres:
+            return engine.bin_index(x, y, bins=bins, range=range)
+        else:
+            return self._bin_index(engine, x, y, bins, range)
+
+    def select_rectangle(self, xmin, xmax, ymin, ymax, count=False):
+        """
+        Return the indices of the points inside a rectangle (including its
+        edges), or the number of these points if ``count`` is `True`.
+        """
+        x, y = self._coordinates()
+        xmin, xmax, ymin, ymax = self._scale_limits(xmin, xmax, ymin, ymax)
+        mask = rectangle_mask(np.asarray(x), np.asarray(y), xmin, xmax, ymin, ymax)
+        return self._selection_result(mask, count)
+
+    def select_polygon(self, vertices, count=False):
+        """
+        Return the indices of the points inside a polygon, or the number of
+        these points if ``count`` is `True`.
+
+        The ``vertices`` should be given as an ``(N, 2)`` array of ``(x, y)``
+        data coordinates, such as the vertices returned by
+        :class:`~matplotlib.widgets.LassoSelector`. On log axes, the edges of
+        the polygon are straight lines on the screen.
+        """
+        vertices = np.asarray(vertices, dtype=float)
+        vx, vy = vertices[:, 0], vertices[:, 1]
+        if self._ax.get_xscale() == 'log':
+            vx = np.log10(vx)
+        if self._ax.get_yscale() == 'log':
+            vy = np.log10(vy)
+        x, y = self._coordinates()
+        mask = polygon_mask(np.asarray(x), np.asarray(y), vx, vy)
+        return self._selection_result(mask, count)
+
+    def select_pixels(self, mask, range, count=False):
+        """
+        Return the indices of the points inside a set of pixels, or the number
+        of these points if ``count`` is `True`.
+
+        The pixels are given by a boolean ``mask`` with shape ``(ny, nx)``
+        covering ``range``, following the same conventions as the density
+        maps returned when calling the helper.
+        """
+        mask = np.asarray(mask, dtype=bool)
+        (ymin, ymax), (xmin, xmax) = range
+        xmin, xmax, ymin, ymax = self._scale_limits(xmin, xmax, ymin, ymax)
+        x, y = self._coordinates()
+        engine = get_engine(self._engine, len(x))
+        index = self._pixel_index(engine, x, y, mask.shape, ((ymin, ymax), (xmin, xmax)))
+        return self._selection_result(np.append(mask.ravel(), False)[index], count)
+
+    def _compute(self, x, y, weights, columns, bins, range):
+
+        engine = get_engine(self._engine, len(x))
+
+        if self._geometry is not None:
+            array = self._geometry_array(x, y, weights, bins, range)
+        elif columns is not None:
+            # Re-use the arrays for all columns if the bins and range are the
+            # same as last time, otherwise bin all the columns in one go.
+            key = (bins, range) + self._view_key()
+            if self._column_arrays is None or self._column_arrays[0] != key:
+                arrays = self._reduce_columns(engine, x, y, bins, range, columns)
+                self._column_arrays = key, arrays
+            array = self._column_arrays[1][self._column]
+        elif self._cache_indices:
+            index = self._bin_index(engine, x, y, bins, range)
+            if weights is None:
+                array = reduce_count(index, None, bins[0] * bins[1]).reshape(bins)
+            else:
+                array = self._reducer(index, weights, bins[0] * bins[1]).reshape(bins)
+        elif weights is None:
+            array = engine.histogram2d(x, y, bins=bins, range=range)
+        elif self._reduce != 'mean':
+            index = engine.bin_index(x, y, bins=bins, range=range)
+            array = self._reducer(index, weights, bins[0] * bins[1]).reshape(bins)
         else:
-            array = histogram2d(y, x, bins=bins, weights=weights,
-                                range=((ymin, ymax), (xmin, xmax)))
-            count = histogram2d(y, x, bins=bins,
-                                range=((ymin, ymax), (xmin, xmax)))
+            array = engine.histogram2d(x, y, bins=bins, weights=weights, range=range)
+            count = engine.histogram2d(x, y, bins=bins, range=range)
 
             with np.errstate(invalid='ignore'):
                 array /= count
 
         return array
+
+    def _reduce_columns(self, engine, x, y, bins, range, columns):
+
+        # The pixel index of each point is only computed once for all columns
+        index = self._bin_index(engine, x, y, bins, range)
+        size = bins[0] * bins[1]
+
+        arrays = {}
+
+        if self._reduce == 'mean':
+            count = reduce_count(index, None, size)
+            for key, values in columns.items():
+                with np.errstate(invalid='ignore'):
+                    arrays[key] = (reduce_sum(index, values, size) / count).reshape(bins)
+        else:
+            for key, values in columns.items():
+                arrays[key] = self._reducer(index, values, size).reshape(bins)
+
+        return arrays
+
+    def _geometry_array(self, x, y, weights, bins, range):
+
+        # Aggregate the points into cells, then find which cell the center
+        # of each pixel falls in to rasterize the cells.
+
+        index, ncells = self._geometry.cell_index(x, y, bins, range)
+
+        if weights is None:
+            values = reduce_count(index, None, ncells)
+        else:
+            values = self._reducer(index, weights, ncells)
+
+        ny, nx = bins
+        (ymin, ymax), (xmin, xmax) = range
+        xc = xmin + (np.arange(nx) + 0.5) * ((xmax - xmin) / nx)
+        yc = ymin + (np.arange(ny) + 0.5) * ((ymax - ymin) / ny)
+        xc, yc = np.meshgrid(xc, yc)
+
+        pixel_index, _ = self._geometry.cell_index(xc.ravel(), yc.ravel(), bins, range)
+
+        return np.append(values, np.nan)[pixel_index].reshape(bins)
@@ -2,6 +2,7 @@ import numpy as np
 
 from .color import make_cmap
 from .base_image_artist import BaseImageArtist
+from .sparse import SparseDensity
 
 __all__ = ['GenericDensityArtist']
 
@@ -22,6 +23,9 @@ class GenericDensityArtist(BaseImageArtist):
     dpi : int or `None`
         The number of dots per inch to include in the density map. To use
         the native resolution of the drawing device, set this to None.
+    export_dpi : int or `None`
+        The number of dots per inch to use for the density map when saving to
+        vector formats such as PDF or SVG. If `None`, ``dpi`` is used.
     cmap : `matplotlib.colors.Colormap`
         The colormap to use for the density map.
     color : str or tuple
@@ -42,6 +46,18 @@ class GenericDensityArtist(BaseImageArtist):
         histogram - this should take the arguments ``bins`` and ``range`` as
         defined by :func:`~numpy.histogram2d` as well as a ``pressed`` keyword
         argument that indicates whether the user is currently panning/zooming.
+        If the callable has a ``version`` attribute, it should change whenever
+        the underlying data changes, and the computation is then skipped when
+        neither the version nor the bins/range have changed since the last
+        draw. The function can also return a
+        :class:`~mpl_scatter_density.sparse.SparseDensity` instance, in which
+        case only the occupied pixels are normalized and color-mapped, and
+        ``vmin``/``vmax`` functions are given the values of the occupied
+        pixels followed by the fill value (if any pixels are empty). In this
+        case, :meth:`get_array` still returns the density map rather than
+        the color-mapped image. If the callable has ``downres`` and ``upres``
+        methods, these are called when panning/zooming starts and stops so
+        that it can compute lower-resolution density maps in the meantime.
     kwargs
         Any additional keyword arguments are passed to AxesImage.
     """
@@ -51,6 +67,8 @@ class GenericDensityArtist(BaseImageArtist):
 
         self._density_vmin = np.nanmin
         self._density_vmax = np.nanmax
+        self._sparse_array = None
+        self._sparse_dense = None
 
         super(GenericDensityArtist, self).__init__(ax,
                                                    array_func=histogram2d_func,
@@ -73,18 +91,61 @@ class GenericDensityArtist(BaseImageArtist):
 
     def set_data(self, array):
 
+        if isinstance(array, SparseDensity):
+            if len(array.values) < array.size:
+                values = np.append(array.values, array.fill_value)
+            else:
+                values = array.values
+        else:
+            values = array
+
         if callable(self._density_vmin):
-            vmin = self._density_vmin(array)
+            vmin = self._density_vmin(values)
         else:
             vmin = self._density_vmin
 
         if callable(self._density_vmax):
-            vmax = self._density_vmax(array)
+            vmax = self._density_vmax(values)
         else:
             vmax = self._density_vmax
 
-        super(GenericDensityArtist, self).set_data(array)
-        super(GenericDensityArtist, self).set_clim(vmin, vmax)
+        if isinstance(array, SparseDensity):
+            # Color-map only the occupied pixels and fill the rest of the
+            # image with the color of the fill value. The limits need to be
+            # set first since they are used to compute the colors.
+            super(GenericDensityArtist, self).set_clim(vmin, vmax)
+            rgba = np.empty(array.shape + (4,), dtype=np.uint8)
+            rgba[...] = self.to_rgba(np.array([array.fill_value], dtype=float), bytes=True)[0]
+            rgba.reshape((-1, 4))[array.index] = self.to_rgba(array.values, bytes=True)
+            super(GenericDensityArtist, self).set_data(rgba)
+            self._sparse_array = array
+            self._sparse_dense = None
+        else:
+            super(GenericDensityArtist, self).set_data(array)
+            super(GenericDensityArtist, self).set_clim(vmin, vmax)
+            self._sparse_array = None
+            self._sparse_dense = None
+
+    def get_array(self):
+        if self._sparse_array is None:
+            return super(GenericDensityArtist, self).get_array()
+        # The image holds the color-mapped pixels, so we return the density
+        # map instead, which is only made dense when it is first requested.
+        if self._sparse_dense is None:
+            self._sparse_dense = np.ma.masked_invalid(self._sparse_array.toarray())
+        return self._sparse_dense
+
+    def on_press(self, event=None, force=False):
+        super(GenericDensityArtist, self).on_press(event=event, force=force)
+        downres = getattr(self._array_func, 'downres', None)
+        if self._pressed and downres is not None:
+            downres()
+
+    def on_release(self, event=None):
+        upres = getattr(self._array_func, 'upres', None)
+        if upres is not None:
+            upres()
+        return super(GenericDensityArtist, self).on_release(event=event)
 
     def set_clim(self, vmin, vmax):
         self._density_vmin = vmin
@@ -0,0 +1,156 @@
+"""
+Non-rectangular bin geometries.
+
+Geometries map coordinates to flat cell indices. The same mapping is used
+both for the points, to aggregate them into cells, and for the centers of
+the pixels of the image, to rasterize the cells, which means that no
+polygon objects need to be created. Coordinates are given in the space in
+which the binning is done (i.e. log10 of the values for log axes).
+"""
+
+import numpy as np
+
+__all__ = ['HexGeometry', 'PolarGeometry', 'get_geometry']
+
+
+class HexGeometry:
+    """
+    Hexagonal cells, which are regular hexagons on screen.
+
+    Parameters
+    ----------
+    gridsize : int
+        The number of hexagons along the x direction of the image, which
+        means that the size of the hexagons on screen does not change when
+        zooming or when the resolution is reduced while panning.
+    """
+
+    def __init__(self, gridsize=50):
+        if gridsize < 1:
+            raise ValueError('gridsize should be strictly positive')
+        self.gridsize = gridsize
+
+    def cell_index(self, x, y, bins, range):
+        """
+        Return the flat index of the cell for each position (with positions
+        outside the image having an index equal to the number of cells) as
+        well as the number of cells.
+        """
+
+        ny, nx = bins
+        (ymin, ymax), (xmin, xmax) = range
+
+        # Convert to pixel coordinates, then to units of the size (center to
+        # vertex) of the pointy-top hexagons.
+        size = nx / self.gridsize / np.sqrt(3)
+        px = (np.asarray(x, dtype=float) - xmin) * (nx / (xmax - xmin))
+        py = (np.asarray(y, dtype=float) - ymin) * (ny / (ymax - ymin))
+
+        inside = (px >= 0) & (px < nx) & (py >= 0) & (py < ny)
+
+        # Find the axial coordinates of the hexagons by rounding the
+        # fractional cube coordinates.
+        q = (np.sqrt(3) / 3 * px - py / 3) / size
+        r = (2 / 3 * py) / size
+        s = -q - r
+
+        rq, rr, rs = np.round(q), np.round(r), np.round(s)
+        dq, dr, ds = np.abs(rq - q), np.abs(rr - r), np.abs(rs - s)
+        fix_q = (dq > dr) & (dq > ds)
+        fix_r = ~fix_q & (dr > ds)
+        rq = np.where(fix_q, -rr - rs, rq)
+        rr = np.where(fix_r, -rq - rs, rr)
+
+        # Convert to offset coordinates, which span a rectangular range
+        row = rr
+        col = rq + np.floor(rr / 2)
+
+        # Leave a margin for hexagons that are only partially inside the image
+        nrows = int(np.ceil(ny / (1.5 * size))) + 3
+        ncols = int(np.ceil(nx / (np.sqrt(3) * size))) + 3
+        ncells = nrows * ncols
+
+        index = np.full(px.shape, ncells, dtype=np.intp)
+        index[inside] = ((row[inside] + 1).astype(np.intp) * ncols +
+                         (col[inside] + 1).astype(np.intp))
+
+        return index, ncells
+
+
+class PolarGeometry:
+    """
+    Cells in polar coordinates.
+
+    Parameters
+    ----------
+    nr, ntheta : int
+        The number of cells along the radius and the azimuth.
+    center : tuple
+        The ``(x, y)`` coordinates of the center.
+    rmax : float or `None`
+        The maximum radius. If `None`, the distance from the center to the
+        farthest corner of the image is used.
+    """
+
+    def __init__(self, nr=20, ntheta=36, center=(0, 0), rmax=None):
+        if nr < 1 or ntheta < 1:
+            raise ValueError('nr and ntheta should be strictly positive')
+        self.nr = nr
+        self.ntheta = ntheta
+        self.center = center
+        self.rmax = rmax
+
+    def cell_index(self, x, y, bins, range):
+        """
+        Return the flat index of the cell for each position (with positions
+        outside the image or beyond the maximum radius having an index equal
+        to the number of cells) as well as the number of cells.
+        """
+
+        (ymin, ymax), (xmin, xmax) = range
+
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+
+        inside = (x >= xmin) & (x < xmax) & (y >= ymin) & (y < ymax)
+
+        dx = x - self.center[0]
+        dy = y - self.center[1]
+
+        if self.rmax is None:
+            rmax = max(np.hypot(cx - self.center[0], cy - self.center[1])
+                       for cx in (xmin, xmax) for cy in (ymin, ymax))
+        else:
+            rmax = self.rmax
+
+        ir = np.floor(np.hypot(dx, dy) * (self.nr / rmax))
+        itheta = np.floor((np.arctan2(dy, dx) + np.pi) * (self.ntheta / (2 * np.pi)))
+        itheta = np.minimum(itheta, self.ntheta - 1)
+
+        inside &= ir < self.nr
+
+        ncells = self.nr * self.ntheta
+
+        index = np.full(x.shape, ncells, dtype=np.intp)
+        index[inside] = (ir[inside].astype(np.intp) * self.ntheta +
+                         itheta[inside].astype(np.intp))
+
+        return index, ncells
+
+
+GEOMETRIES = {'hex': HexGeometry,
+              'polar': PolarGeometry}
+
+
+def get_geometry(geometry):
+    """
+    Return the geometry instance for ``geometry``, which can be `None` (for
+    rectangular pixels), ``'hex'``, ``'polar'``, or a geometry instance.
+    """
+    if geometry is None or not isinstance(geometry, str):
+        return geometry
+    try:
+        return GEOMETRIES[geometry]()
+    except KeyError:
+        raise ValueError('geometry should be one of: {0}'
+                         .format(', '.join(sorted(GEOMETRIES))))
@@ -0,0 +1,101 @@
+"""
+Accounting for the memory used by the density helpers.
+
+Helpers keep arrays derived from the data (such as the log10 of the
+coordinates, or cached pixel indices and histograms) to make redrawing
+fast. Each helper reports the number of bytes held by each of these
+structures with its ``memory_usage`` method. If a global budget is set with
+:func:`set_memory_budget`, structures are evicted from the least recently
+used helpers whenever the total exceeds the budget, and are then recomputed
+on demand if they are needed again.
+
+Some structures, such as copies of the data made when setting up a helper,
+can't be recomputed on demand. These are still reported so that the totals
+are accurate, and are listed in the ``non_evictable`` attribute of the
+helper so that they are never evicted.
+"""
+
+import weakref
+from itertools import count
+
+import numpy as np
+
+__all__ = ['set_memory_budget', 'get_memory_budget', 'total_memory_usage',
+           'enforce_memory_budget', 'track', 'nbytes']
+
+_BUDGET = None
+_HELPERS = weakref.WeakSet()
+_COUNTER = count()
+
+
+def nbytes(array):
+    """
+    Return the number of bytes held in memory by ``array``, which can be
+    `None`. Memory-mapped arrays are not counted since they are backed by
+    files and can be paged out by the operating system.
+    """
+    if array is None or isinstance(array, np.memmap):
+        return 0
+    return array.nbytes
+
+
+def set_memory_budget(budget):
+    """
+    Set the maximum number of bytes that can be used by the structures
+    derived from the data in all helpers, or `None` for no limit.
+    """
+    global _BUDGET
+    if budget is not None and budget < 0:
+        raise ValueError('budget should be positive')
+    _BUDGET = budget
+    enforce_memory_budget()
+
+
+def get_memory_budget():
+    """
+    Return the current memory budget in bytes, or `None` if there is no limit.
+    """
+    return _BUDGET
+
+
+def total_memory_usage():
+    """
+    Return the total number of bytes used by the structures derived from the
+    data in all helpers.
+    """
+    return sum(sum(helper.memory_usage().values()) for helper in list(_HELPERS))
+
+
+def track(helper):
+    """
+    Record that ``helper`` was just used, and evict structures if the budget
+    is exceeded.
+    """
+    helper._last_used = next(_COUNTER)
+    _HELPERS.add(helper)
+    enforce_memory_budget()
+
+
+def enforce_memory_budget():
+    """
+    Evict structures from the least recently used helpers until the total
+    memory usage is within the budget.
+    """
+
+    if _BUDGET is None:
+        return
+
+    helpers = sorted(_HELPERS, key=lambda helper: helper._last_used)
+
+    total = sum(sum(helper.memory_usage().values()) for helper in helpers)
+
+    # Within each helper, we evict the largest structures first
+    for helper in helpers:
+        usage = helper.memory_usage()
+        non_evictable = getattr(helper, 'non_evictable', ())
+        for name in sorted(usage, key=usage.get, reverse=True):
+            if total <= _BUDGET:
+                return
+            if usage[name] > 0 and name not in non_evictable:
+                helper.evict(name)
+                total -= usage[name]
@@ -0,0 +1,237 @@
+"""
+Functions to reduce the values of points falling inside each pixel.
+
+Reducers are functions that take an array of flat pixel indices (one per
+point), the array of values for each point, and the number of pixels, and
+return a 1D array with one value per pixel. Points that fall outside the
+image have an index equal to the number of pixels, which makes it possible
+to use e.g. :func:`~numpy.bincount` directly on the indices.
+"""
+
+import numpy as np
+
+__all__ = ['bin_index', 'quantile', 'get_reducer', 'REDUCERS']
+
+
+def bin_index(x, y, bins, range):
+    """
+    Compute the flat pixel index of each point.
+
+    This uses the same conventions as :func:`fast_histogram.histogram2d`,
+    with ``y`` along the first dimension of the image. Points that fall
+    outside the range (including NaN values) are given an index equal to the
+    total number of pixels.
+    """
+
+    ny, nx = bins
+    (ymin, ymax), (xmin, xmax) = range
+
+    # Note that this expression is deliberately the same as in fast-histogram
+    # so that points on the edges of pixels end up in the same pixels.
+    ix = (np.asarray(x, dtype=float) - xmin) * (nx / (xmax - xmin))
+    iy = (np.asarray(y, dtype=float) - ymin) * (ny / (ymax - ymin))
+
+    valid = (ix >= 0) & (ix < nx) & (iy >= 0) & (iy < ny)
+
+    index = np.full(ix.shape, nx * ny, dtype=np.intp)
+    index[valid] = iy[valid].astype(np.intp) * nx + ix[valid].astype(np.intp)
+
+    return index
+
+
+def _valid(index, values, size):
+    keep = index < size
+    return index[keep], np.asarray(values)[keep]
+
+
+def reduce_count(index, values, size):
+    return np.bincount(index, minlength=size + 1)[:size].astype(float)
+
+
+def reduce_sum(index, values, size):
+    return np.bincount(index, weights=values, minlength=size + 1)[:size]
+
+
+def reduce_mean(index, values, size):
+    count = reduce_count(index, values, size)
+    with np.errstate(invalid='ignore'):
+        return reduce_sum(index, values, size) / count
+
+
+def reduce_var(index, values, size):
+    # We use two passes rather than accumulating the sum of squares, since
+    # the latter suffers from catastrophic cancellation.
+    count = reduce_count(index, values, size)
+    with np.errstate(invalid='ignore'):
+        mean = reduce_sum(index, values, size) / count
+    mean = np.append(mean, 0.)
+    residuals = (np.asarray(values) - mean[index]) ** 2
+    with np.errstate(invalid='ignore'):
+        return reduce_sum(index, residuals, size) / count
+
+
+def reduce_std(index, values, size):
+    return np.sqrt(reduce_var(index, values, size))
+
+
+def _extremum(ufunc, initial):
+    def reducer(index, values, size):
+        empty = np.bincount(index, minlength=size + 1)[:size] == 0
+        index, values = _valid(index, values, size)
+        array = np.full(size, initial)
+        ufunc.at(array, index, values)
+        array[empty] = np.nan
+        return array
+    return reducer
+
+
+reduce_min = _extremum(np.minimum, np.inf)
+reduce_max = _extremum(np.maximum, -np.inf)
+
+
+def _position(ufunc, initial):
+    # Find the value of the first/last point (in the order of the input
+    # arrays) inside each pixel.
+    def reducer(index, values, size):
+        if len(values) == 0:
+            return np.full(size, np.nan)
+        position = np.full(size + 1, initial, dtype=np.intp)
+        ufunc.at(position, index, np.arange(len(index)))
+        position = position[:size]
+        empty = position == initial
+        array = np.asarray(values, dtype=float)[np.where(empty, 0, position)]
+        array[empty] = np.nan
+        return array
+    return reducer
+
+
+reduce_first = _position(np.minimum, np.iinfo(np.intp).max)
+reduce_last = _position(np.maximum, -1)
+
+
+def quantile(q):
+    """
+    Return a reducer that computes the ``q``-th quantile in each pixel.
+
+    The quantile is computed using linear interpolation between the closest
+    values, as for the default method in :func:`numpy.quantile`.
+    """
+
+    if not 0 <= q <= 1:
+        raise ValueError('q should be in the range [0, 1]')
+
+    def reduce_quantile(index, values, size):
+
+        index, values = _valid(index, values, size)
+
+        if len(values) == 0:
+            return np.full(size, np.nan)
+
+        # Sort the values by pixel then by value, which then allows us to find
+        # the quantiles for all pixels at once from the offset of each pixel
+        # in the sorted array.
+        order = np.lexsort((values, index))
+        values = values[order]
+
+        count = np.bincount(index, minlength=size)
+        start = np.cumsum(count) - count
+
+        empty = count == 0
+        position = start + q * (np.maximum(count, 1) - 1)
+        lower = np.floor(position).astype(np.intp)
+        upper = np.ceil(position).astype(np.intp)
+        fraction = position - lower
+
+        # Empty pixels at the end of the image would otherwise point past the
+        # end of the array
+        lower = np.minimum(lower, len(values) - 1)
+        upper = np.minimum(upper, len(values) - 1)
+
+        array = values[lower] + (values[upper] - values[lower]) * fraction
+        array[empty] = np.nan
+
+        return array
+
+    return reduce_quantile
+
+
+reduce_median = quantile(0.5)
+
+# Number of bits used to select the HyperLogLog register, and the
+# corresponding number of registers per pixel
+HLL_BITS = 4
+HLL_REGISTERS = 2 ** HLL_BITS
+HLL_ALPHA = 0.673
+
+
+def _hash32(values):
+    # Hash the bit representation of the values using the splitmix64
+    # finalizer, and keep the upper 32 bits. We add 0 to normalize -0.0.
+    values = np.asarray(values, dtype=np.float64) + 0.
+    h = values.view(np.uint64)
+    h = (h ^ (h >> np.uint64(30))) * np.uint64(0xbf58476d1ce4e5b9)
+    h = (h ^ (h >> np.uint64(27))) * np.uint64(0x94d049bb133111eb)
+    h = h ^ (h >> np.uint64(31))
+    return (h >> np.uint64(32)).astype(np.int64)
+
+
+def reduce_count_distinct(index, values, size):
+    """
+    Estimate the number of distinct values in each pixel.
+
+    This uses a small HyperLogLog sketch with 16 one-byte registers per
+    pixel, which gives a typical relative error of ~25% for large counts
+    and is close to exact for small counts.
+    """
+
+    index, values = _valid(index, values, size)
+
+    h = _hash32(values)
+
+    # The first bits select the register and the rank is given by the
+    # position of the leftmost 1-bit in the remaining bits.
+    remaining = 32 - HLL_BITS
+    register = h >> remaining
+    w = h & ((1 << remaining) - 1)
+    rank = (remaining - np.frexp(w.astype(float))[1] + 1).astype(np.uint8)
+
+    registers = np.zeros(size * HLL_REGISTERS, dtype=np.uint8)
+    np.maximum.at(registers, index * HLL_REGISTERS + register, rank)
+    registers = registers.reshape((size, HLL_REGISTERS))
+
+    m = HLL_REGISTERS
+    estimate = HLL_ALPHA * m ** 2 / np.sum(2. ** -registers.astype(float), axis=1)
+
+    # Use linear counting for small cardinalities
+    zeros = np.sum(registers == 0, axis=1)
+    small = (estimate <= 2.5 * m) & (zeros > 0)
+    estimate[small] = m * np.log(m / zeros[small])
+
+    return estimate
+
+
+REDUCERS = {'count': reduce_count,
+            'sum': reduce_sum,
+            'mean': reduce_mean,
+            'var': reduce_var,
+            'std': reduce_std,
+            'min': reduce_min,
+            'max': reduce_max,
+            'first': reduce_first,
+            'last': reduce_last,
+            'median': reduce_median,
+            'count_distinct': reduce_count_distinct}
+
+
+def get_reducer(reduce):
+    """
+    Return the reducer function for ``reduce``, which should be either the
+    name of one of the built-in reducers or a callable.
+    """
+    if callable(reduce):
+        return reduce
+    try:
+        return REDUCERS[reduce]
+    except (KeyError, TypeError):
+        raise ValueError('reduce should be a callable or one of: {0}'
+                         .format(', '.join(sorted(REDUCERS))))
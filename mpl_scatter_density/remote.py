@@ -0,0 +1,389 @@
+"""
+Computing density maps in a different process or on a different machine.
+
+:class:`DensityServer` holds the data and answers requests for density maps,
+and :class:`DensityClient` is a histogram function that can be passed to
+:class:`~mpl_scatter_density.generic_density_artist.GenericDensityArtist`
+and requests density maps from a server::
+
+    # On the server
+    server = DensityServer(x, y, address=('localhost', 6000), authkey=b'secret')
+    server.serve_forever()
+
+    # On the client, after forwarding the port with e.g.
+    # ssh -N -L 6000:localhost:6000 server.example.com
+    client = DensityClient(ax, ('localhost', 6000), authkey=b'secret')
+    ax.add_artist(GenericDensityArtist(ax, histogram2d_func=client))
+
+Communication uses :mod:`multiprocessing.connection`, which authenticates
+clients with the shared ``authkey``. Since messages are pickled, anyone with
+the key can run code on the server, and the connection is not encrypted, so
+the server should only listen on ``localhost`` and be accessed through an SSH
+tunnel. Density maps are sent as sparse arrays if most pixels are empty, and
+are compressed with zstandard if it is installed on both sides, and zlib
+otherwise.
+"""
+
+import os
+import socket
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import Future
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+
+from .fixed_data_density_helper import FixedDataDensityHelper
+from .sparse import SparseDensity
+
+__all__ = ['DensityServer', 'DensityClient', 'encode_array', 'decode_array']
+
+# The time to wait before accepting connections again if this fails, for
+# example because the process has run out of file descriptors.
+ACCEPT_RETRY_DELAY = 0.5
+
+
+def _compressors():
+    compressors = {'zlib': (lambda data: zlib.compress(data, 1), zlib.decompress)}
+    try:
+        import zstandard
+    except ImportError:
+        pass
+    else:
+        compressors['zstd'] = (zstandard.ZstdCompressor().compress,
+                               zstandard.ZstdDecompressor().decompress)
+    return compressors
+
+
+def _compact_values(values):
+    # Counts are sent as unsigned integers, which compress much better than
+    # the equivalent floating-point values.
+    if (len(values) > 0 and np.all(np.isfinite(values)) and
+            values.min() >= 0 and values.max() < 2 ** 32 and
+            np.all(values == np.round(values))):
+        return values.astype(np.uint32)
+    return values
+
+
+def encode_array(array, compression='zlib'):
+    """
+    Encode a density map, which can be a dense array or a
+    :class:`~mpl_scatter_density.sparse.SparseDensity`, into a compact
+    representation.
+
+    If fewer than a third of the pixels differ from the most common empty
+    value (zero or NaN), only the indices and values of these pixels are
+    kept. The result is a tuple that can be pickled, and that can be decoded
+    with :func:`decode_array`.
+    """
+
+    compress, _ = _compressors()[compression]
+
+    if isinstance(array, SparseDensity):
+        sparse = array
+    else:
+        array = np.asarray(array)
+        sparse = SparseDensity.from_array(array)
+        if len(sparse.index) > array.size / 3:
+            values = _compact_values(array.ravel())
+            return ('dense', array.shape, array.dtype.str, None, compression,
+                    values.dtype.str, None, compress(values.tobytes()))
+
+    index = sparse.index.astype(np.uint32)
+    values = _compact_values(sparse.values)
+    return ('sparse', sparse.shape, sparse.dtype.str, sparse.fill_value, compression,
+            values.dtype.str, compress(index.tobytes()), compress(values.tobytes()))
+
+
+def decode_array(encoded, sparse=False):
+    """
+    Decode a density map encoded with :func:`encode_array`. If ``sparse`` is
+    `True`, a :class:`~mpl_scatter_density.sparse.SparseDensity` is returned
+    instead of a dense array.
+    """
+
+    kind, shape, dtype, fill, compression, values_dtype, index, values = encoded
+
+    _, decompress = _compressors()[compression]
+
+    values = np.frombuffer(decompress(values), dtype=values_dtype).astype(dtype)
+
+    if kind == 'sparse':
+        array = SparseDensity(shape, np.frombuffer(decompress(index), dtype=np.uint32)
+                              .astype(np.intp), values, fill_value=fill)
+        return array if sparse else array.toarray()
+    else:
+        array = values.reshape(shape)
+        return SparseDensity.from_array(array) if sparse else array
+
+
+class _Scales:
+    # Minimal stand-in for the axes used by the helpers on the server side,
+    # which only need to know the scales.
+
+    def __init__(self):
+        self.xscale = 'linear'
+        self.yscale = 'linear'
+
+    def get_xscale(self):
+        return self.xscale
+
+    def get_yscale(self):
+        return self.yscale
+
+
+class DensityServer:
+    """
+    Server computing density maps of (x, y) scatter data.
+
+    Parameters
+    ----------
+    x, y : iterable
+        The data to compute density maps for.
+    address : tuple
+        The ``(host, port)`` to listen on. If the port is 0, a free port is
+        chosen, and the actual address is then given by
+        :attr:`DensityServer.address`.
+    authkey : bytes, optional
+        The key that clients should use to connect. If not specified, a
+        random key is generated, which can be accessed with
+        :attr:`DensityServer.authkey`.
+    kwargs
+        Any additional keyword arguments are passed to
+        :class:`~mpl_scatter_density.fixed_data_density_helper.FixedDataDensityHelper`.
+    """
+
+    def __init__(self, x, y, address=('localhost', 0), authkey=None, **kwargs):
+        self.helper = FixedDataDensityHelper(_Scales(), x, y, **kwargs)
+        self.authkey = os.urandom(32) if authkey is None else authkey
+        self._listener = Listener(address, authkey=self.authkey)
+        # The helper can only compute one density map at a time, but the
+        # pending requests have their own lock so that identical requests
+        # can be coalesced while a map is being computed.
+        self._lock = threading.Lock()
+        self._pending_lock = threading.Lock()
+        self._pending = {}
+        self._closed = False
+
+    @property
+    def address(self):
+        """
+        The address the server is listening on.
+        """
+        return self._listener.address
+
+    def serve_forever(self):
+        """
+        Accept connections until :meth:`close` is called, handling each
+        client in a separate thread.
+        """
+        while not self._closed:
+            try:
+                connection = self._listener.accept()
+            except (EOFError, AuthenticationError):
+                # The client disconnected or used the wrong key
+                continue
+            except OSError:
+                if self._closed:
+                    break
+                time.sleep(ACCEPT_RETRY_DELAY)
+                continue
+            if self._closed:
+                connection.close()
+                break
+            threading.Thread(target=self._handle, args=(connection,), daemon=True).start()
+
+    def close(self):
+        """
+        Stop accepting connections.
+        """
+        self._closed = True
+        # Connect to the server to wake up serve_forever if it is waiting
+        # for a connection - the connection then fails to authenticate.
+        try:
+            socket.create_connection(self.address).close()
+        except OSError:  # pragma: nocover
+            pass
+        self._listener.close()
+
+    def _handle(self, connection):
+        with connection:
+            while True:
+                try:
+                    request = connection.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    response = 'ok', self._respond(request)
+                except Exception as exc:
+                    response = 'error', '{0}: {1}'.format(type(exc).__name__, exc)
+                connection.send(response)
+
+    def _respond(self, request):
+
+        if request['command'] == 'info':
+            with self._lock:
+                return {'version': self.helper.version,
+                        'bounds': self.helper.get_bounds(),
+                        'compressions': sorted(_compressors())}
+
+        elif request['command'] == 'density':
+
+            # Identical requests from several clients arriving at the same
+            # time are coalesced so that the density map is only computed
+            # once.
+            key = (request['bins'], request['range'], request['xscale'],
+                   request['yscale'], request['downres'], request['compression'])
+
+            with self._pending_lock:
+                future = self._pending.get(key)
+                owner = future is None
+                if owner:
+                    future = self._pending[key] = Future()
+
+            if owner:
+                try:
+                    future.set_result(self._compute(request))
+                except Exception as exc:
+                    future.set_exception(exc)
+                finally:
+                    with self._pending_lock:
+                        del self._pending[key]
+
+            return future.result()
+
+        else:
+            raise ValueError('Unknown command: {0}'.format(request['command']))
+
+    def _compute(self, request):
+        with self._lock:
+            self.helper._ax.xscale = request['xscale']
+            self.helper._ax.yscale = request['yscale']
+            if request['downres']:
+                self.helper.downres()
+            else:
+                self.helper.upres()
+            array = self.helper(bins=request['bins'], range=request['range'])
+            version = self.helper.version
+        return version, encode_array(array, compression=request['compression'])
+
+
+class DensityClient:
+    """
+    Histogram function requesting density maps from a :class:`DensityServer`.
+
+    Parameters
+    ----------
+    ax : `matplotlib.axes.Axes`
+        The axes the density map is shown in, which is used to find the
+        scales of the axes.
+    address : tuple
+        The ``(host, port)`` address of the server.
+    authkey : bytes
+        The key to use to connect to the server.
+    cache_size : int
+        The number of density maps to keep in the client-side cache, which
+        avoids sending requests again when going back to a previous view.
+    sparse : bool
+        Whether to return density maps as
+        :class:`~mpl_scatter_density.sparse.SparseDensity` instances, which
+        avoids creating dense arrays for density maps sent in sparse form.
+    """
+
+    compute_when_pressed = True
+
+    def __init__(self, ax, address, authkey, cache_size=16, sparse=False):
+        self._ax = ax
+        self._connection = Client(address, authkey=authkey)
+        self._connection_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self._pending = {}
+        self._downres = False
+        self._sparse = sparse
+        self.refresh()
+
+    def refresh(self):
+        """
+        Clear the cache and get the latest version and bounds of the data
+        from the server.
+        """
+        info = self._request({'command': 'info'})
+        with self._lock:
+            self._cache.clear()
+            self.version = info['version']
+        self._bounds = info['bounds']
+        if 'zstd' in info['compressions'] and 'zstd' in _compressors():
+            self._compression = 'zstd'
+        else:
+            self._compression = 'zlib'
+
+    def downres(self):
+        self._downres = True
+
+    def upres(self):
+        self._downres = False
+
+    def get_bounds(self):
+        """
+        Return the ``(xmin, xmax, ymin, ymax)`` bounds of the data.
+        """
+        return self._bounds
+
+    def close(self):
+        self._connection.close()
+
+    def _request(self, request):
+        with self._connection_lock:
+            self._connection.send(request)
+            status, response = self._connection.recv()
+        if status == 'error':
+            raise RuntimeError('The server returned an error: {0}'.format(response))
+        return response
+
+    def __call__(self, bins=None, range=None):
+
+        bins = tuple(int(n) for n in bins)
+        range = tuple(tuple(float(v) for v in r) for r in range)
+
+        request = {'command': 'density', 'bins': bins, 'range': range,
+                   'xscale': self._ax.get_xscale(), 'yscale': self._ax.get_yscale(),
+                   'downres': self._downres, 'compression': self._compression}
+
+        key = (bins, range, request['xscale'], request['yscale'], self._downres)
+
+        # Identical requests made at the same time (e.g. by several artists
+        # or threads) are coalesced into a single request to the server.
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key].copy()
+            future = self._pending.get(key)
+            owner = future is None
+            if owner:
+                future = self._pending[key] = Future()
+
+        if owner:
+            try:
+                version, encoded = self._request(request)
+                array = decode_array(encoded, sparse=self._sparse)
+                with self._lock:
+                    if version != self.version:
+                        # The data on the server has changed
+                        self.version = version
+                        self._cache.clear()
+                    self._cache[key] = array
+                    while len(self._cache) > self._cache_size:
+                        self._cache.popitem(last=False)
+                future.set_result(array)
+            except Exception as exc:
+                future.set_exception(exc)
+            finally:
+                with self._lock:
+                    del self._pending[key]
+
+        return future.result().copy()
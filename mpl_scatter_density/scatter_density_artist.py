@@ -1,5 +1,8 @@
+import numpy as np
+
 from .generic_density_artist import GenericDensityArtist
 from .fixed_data_density_helper import FixedDataDensityHelper
+from .time_density_helper import TimeDensityHelper
 
 __all__ = ['ScatterDensityArtist']
 
@@ -14,16 +17,58 @@ class ScatterDensityArtist(GenericDensityArtist):
         The axes to plot the artist into.
     x, y : iterable
         The data to plot.
-    c : iterable
+    t : iterable, optional
+        The time of each point. If specified,
+        :meth:`~ScatterDensityArtist.set_time_window` can be used to only
+        show the points inside a time window, which is much faster than
+        passing subsets of the data to :meth:`~ScatterDensityArtist.set_xy`.
+    c : iterable or dict
         Values to use for color-encoding. This is meant to be the same as
-        the argument with the same name in :meth:`~matplotlib.axes.Axes.scatter`
-        although for now only 1D iterables of values are accepted. Note that
-        values are averaged inside each pixel of the density map *before*
-        applying the colormap, which in some cases will be different from what
-        the average color of markers would have been inside each pixel.
+        the argument with the same name in :meth:`~matplotlib.axes.Axes.scatter`.
+        Several columns of values can also be given either as a 2D array with
+        shape ``(N, n_columns)`` or as a dictionary of 1D arrays, in which
+        case all columns are binned at the same time and
+        :meth:`~ScatterDensityArtist.select_column` can be used to choose
+        which one is shown without re-binning the data. Note that
+        values are averaged (or reduced, see ``reduce``) inside each pixel of
+        the density map *before* applying the colormap, which in some cases
+        will be different from what the average color of markers would have
+        been inside each pixel.
+    reduce : str or callable, optional
+        How to combine the values of ``c`` inside each pixel. This can be one
+        of ``'mean'`` (the default), ``'sum'``, ``'count'``, ``'min'``,
+        ``'max'``, ``'var'``, ``'std'``, ``'first'``, ``'last'``,
+        ``'median'`` or ``'count_distinct'`` (an approximate count of the
+        number of distinct values), a reducer returned by
+        :func:`~mpl_scatter_density.reducers.quantile`, or a function that
+        takes the flat pixel index of each point, the values, and the number
+        of pixels, and returns one value per pixel.
+    cache_indices : bool, optional
+        Whether to keep the pixel index of each point for the current view
+        (using 4 bytes per point), which makes changing ``c`` with
+        :meth:`~ScatterDensityArtist.set_c` much faster when the view
+        does not change.
+    engine : str, optional
+        The engine to use to bin the points - this can be ``'fast_histogram'``,
+        ``'numba'`` (which requires the optional numba package and uses
+        several threads), or ``'auto'`` (the default) to use numba for large
+        datasets if it is installed. The numba kernels are compiled the first
+        time they are used, which delays the first draw by a few seconds, and
+        are then cached on disk. Set this to ``'fast_histogram'`` to avoid
+        this.
+    geometry : str, optional
+        The shape of the cells the points are aggregated in. By default, each
+        pixel of the density map is a cell. This can also be set to ``'hex'``
+        or ``'polar'``, or to an instance of
+        :class:`~mpl_scatter_density.geometry.HexGeometry` or
+        :class:`~mpl_scatter_density.geometry.PolarGeometry` to customize
+        the size of the cells. The cells are drawn directly into the image.
     dpi : int or `None`
         The number of dots per inch to include in the density map. To use
         the native resolution of the drawing device, set this to None.
+    export_dpi : int or `None`
+        The number of dots per inch to use for the density map when saving to
+        vector formats such as PDF or SVG. If `None`, ``dpi`` is used.
     downres_factor : int
         For interactive devices, when panning, the density map will
         automatically be made at a lower resolution and including only a
@@ -47,30 +92,126 @@ class ScatterDensityArtist(GenericDensityArtist):
         This is useful since when zooming in/out, the optimal limits change.
     update_while_panning : bool, optional
         Whether to compute histograms on-the-fly while panning.
+    compact : bool, optional
+        Whether to store the log10 of the coordinates (which are needed for
+        log axes) as 32-bit floats, which halves the memory they use. See
+        also :func:`~mpl_scatter_density.memory.set_memory_budget`.
+    sparse : bool, optional
+        Whether to only keep the occupied pixels of the density maps, which
+        then means that only these pixels are normalized and color-mapped.
+        This is faster when most pixels are empty.
+    dtype : `~numpy.dtype`, optional
+        The dtype of the density maps, which can for instance be set to
+        ``np.float32`` to halve the memory used to keep and color-map large
+        images. The maps are still computed as 64-bit floats and converted
+        afterwards, so this does not make the binning itself faster. Integer
+        dtypes can only be used if the maps contain exact counts, i.e. if
+        ``c`` is not specified or ``reduce`` is ``'count'``, and ``geometry``
+        is not specified.
+    cache_dir : str, optional
+        If specified, arrays derived from the data that are expensive to
+        compute (such as the log10 of the coordinates) are saved to this
+        directory, keyed by a hash of the data, and are memory-mapped from
+        there in future sessions rather than being recomputed. Hashing is
+        faster if the optional xxhash package is installed.
     kwargs
         Any additional keyword arguments are passed to AxesImage.
     """
 
-    def __init__(self, ax, x, y, downres_factor=4, c=None, **kwargs):
-        self.histogram2d_helper = FixedDataDensityHelper(ax, x, y, c=c,
-                                                         downres_factor=downres_factor)
+    def __init__(self, ax, x, y, downres_factor=4, c=None, cache_dir=None,
+                 reduce='mean', cache_indices=False, engine='auto', geometry=None,
+                 t=None, compact=False, sparse=False, dtype=None, **kwargs):
+        helper_kwargs = dict(c=c, downres_factor=downres_factor, cache_dir=cache_dir,
+                             reduce=reduce, cache_indices=cache_indices, engine=engine,
+                             geometry=geometry, compact=compact, sparse=sparse,
+                             dtype=dtype)
+        if t is None:
+            self.histogram2d_helper = FixedDataDensityHelper(ax, x, y, **helper_kwargs)
+        else:
+            self.histogram2d_helper = TimeDensityHelper(ax, x, y, t, **helper_kwargs)
         super(ScatterDensityArtist, self).__init__(ax,
                                                    histogram2d_func=self.histogram2d_helper,
                                                    **kwargs)
 
     def set_xy(self, x, y):
         self.histogram2d_helper.set_xy(x, y)
+        self.stale = True
 
     def set_c(self, c):
         self.histogram2d_helper.set_c(c)
+        self.stale = True
+
+    def select_column(self, key):
+        self.histogram2d_helper.select_column(key)
+        self.stale = True
+
+    def set_geometry(self, geometry):
+        self.histogram2d_helper.set_geometry(geometry)
+        self.stale = True
+
+    def set_reduce(self, reduce):
+        self.histogram2d_helper.set_reduce(reduce)
+        self.stale = True
+
+    def select_rectangle(self, xmin, xmax, ymin, ymax, count=False):
+        """
+        Return the indices of the points inside a rectangle (including its
+        edges), or the number of these points if ``count`` is `True`.
+        """
+        return self.histogram2d_helper.select_rectangle(xmin, xmax, ymin, ymax, count=count)
+
+    def select_polygon(self, vertices, count=False):
+        """
+        Return the indices of the points inside a polygon, or the number of
+        these points if ``count`` is `True`.
+
+        The ``vertices`` should be given as an ``(N, 2)`` array of ``(x, y)``
+        data coordinates, such as the vertices returned by
+        :class:`~matplotlib.widgets.LassoSelector`.
+        """
+        return self.histogram2d_helper.select_polygon(vertices, count=count)
+
+    def select_pixels(self, mask, count=False):
+        """
+        Return the indices of the points inside a set of pixels of the density
+        map, or the number of these points if ``count`` is `True`.
+
+        The pixels are given by a boolean ``mask`` with the same shape and
+        orientation as the array returned by
+        :meth:`~matplotlib.image.AxesImage.get_array`, covering the current
+        limits of the axes.
+        """
+
+        mask = np.asarray(mask, dtype=bool)
+
+        xmin, xmax = self._ax.get_xlim()
+        ymin, ymax = self._ax.get_ylim()
+
+        # Undo the flips done when making the image
+        if self.origin == 'upper':
+            mask = np.flipud(mask)
+        if xmin > xmax:
+            xmin, xmax = xmax, xmin
+            mask = mask[:, ::-1]
+        if ymin > ymax:
+            ymin, ymax = ymax, ymin
+            mask = mask[::-1, :]
+
+        return self.histogram2d_helper.select_pixels(mask, ((ymin, ymax), (xmin, xmax)),
+                                                     count=count)
+
+    def set_time_window(self, t0=None, t1=None):
+        """
+        Only show points with times in the ``[t0, t1)`` interval. This
+        requires ``t`` to have been specified when creating the artist.
+        """
+        if not isinstance(self.histogram2d_helper, TimeDensityHelper):
+            raise ValueError('set_time_window can only be used if t is specified')
+        self.histogram2d_helper.set_time_window(t0, t1)
+        self.stale = True
 
     def on_press(self, event=None, force=False):
         if not force:
             if self._update_while_panning and self.histogram2d_helper._downres_factor == 1:
                 return
-        self.histogram2d_helper.downres()
         return super(ScatterDensityArtist, self).on_press(force=force)
-
-    def on_release(self, event=None):
-        self.histogram2d_helper.upres()
-        return super(ScatterDensityArtist, self).on_release()
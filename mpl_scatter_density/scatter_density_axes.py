@@ -1,6 +1,6 @@
-import numpy as np
-
-import matplotlib.pyplot as plt
+# Note that we deliberately don't import matplotlib.pyplot here, to avoid
+# selecting and loading a backend when this package is imported.
+from matplotlib.axes import Axes
 from matplotlib.projections import register_projection
 
 from .scatter_density_artist import ScatterDensityArtist
@@ -8,12 +8,12 @@ from .scatter_density_artist import ScatterDensityArtist
 __all__ = ['ScatterDensityAxes']
 
 
-class ScatterDensityAxes(plt.Axes):
+class ScatterDensityAxes(Axes):
 
     name = 'scatter_density'
 
     def __init__(self, *args, **kwargs):
-        plt.Axes.__init__(self, *args, **kwargs)
+        Axes.__init__(self, *args, **kwargs)
 
     def scatter_density(self, x, y, dpi=72, downres_factor=4, color=None, cmap=None,
                         alpha=1.0, norm=None, **kwargs):
@@ -43,14 +43,21 @@ class ScatterDensityAxes(plt.Axes):
             Transparency of the density map
         norm : `matplotlib.colors.Normalize`
             The normalization class for the density map.
+        kwargs
+            Any additional keyword arguments (such as ``c``, ``reduce``, ``t``,
+            ``engine`` or ``cache_dir``) are passed to
+            :class:`~mpl_scatter_density.scatter_density_artist.ScatterDensityArtist`,
+            which describes all the available options.
         """
 
-        self.set_xlim(np.min(x), np.max(x))
-        self.set_ylim(np.min(y), np.max(y))
-
         scatter = ScatterDensityArtist(self, x, y, dpi=dpi, downres_factor=downres_factor,
                                        color=color, cmap=cmap,
                                        alpha=alpha, norm=norm, **kwargs)
+
+        xmin, xmax, ymin, ymax = scatter.histogram2d_helper.get_bounds()
+        self.set_xlim(xmin, xmax)
+        self.set_ylim(ymin, ymax)
+
         self.add_artist(scatter)
 
         return scatter
@@ -0,0 +1,69 @@
+from .generic_density_artist import GenericDensityArtist
+from .segment_density_helper import SegmentDensityHelper
+
+__all__ = ['SegmentDensityArtist']
+
+
+class SegmentDensityArtist(GenericDensityArtist):
+    """
+    Matplotlib artist to make a density plot of lines.
+
+    Each pixel of the density map gives the number of line segments crossing
+    it, which is useful to show large numbers of lines such as trajectories
+    or time series.
+
+    Parameters
+    ----------
+    ax : `matplotlib.axes.Axes`
+        The axes to plot the artist into.
+    x, y : iterable
+        The vertices of the lines, either as lists of 1D arrays (one per
+        line) or as 1D arrays in which separate lines are separated by NaN
+        values, as for :meth:`~matplotlib.axes.Axes.plot`.
+    dpi : int or `None`
+        The number of dots per inch to include in the density map. To use
+        the native resolution of the drawing device, set this to None.
+    export_dpi : int or `None`
+        The number of dots per inch to use for the density map when saving to
+        vector formats such as PDF or SVG. If `None`, ``dpi`` is used.
+    downres_factor : int
+        For interactive devices, when panning, the density map will
+        automatically be made at a lower resolution. The new dpi of the
+        figure when panning will then be dpi / downres_factor.
+    cmap : `matplotlib.colors.Colormap`
+        The colormap to use for the density map.
+    color : str or tuple
+        The color to use for the density map. This can be any valid
+        Matplotlib color. If specified, this takes precedence over the
+        colormap.
+    alpha : float
+        Overall transparency of the density map.
+    norm : `matplotlib.colors.Normalize`
+        The normalization class for the density map.
+    vmin, vmax : float or func
+        The lower and upper levels used for scaling the density map. These can
+        optionally be functions that take the density array and returns a single
+        value (e.g. a function that returns the 5% percentile, or the minimum).
+        This is useful since when zooming in/out, the optimal limits change.
+    update_while_panning : bool, optional
+        Whether to compute histograms on-the-fly while panning.
+    kwargs
+        Any additional keyword arguments are passed to AxesImage.
+    """
+
+    def __init__(self, ax, x, y, downres_factor=4, **kwargs):
+        self.histogram2d_helper = SegmentDensityHelper(ax, x, y,
+                                                       downres_factor=downres_factor)
+        super(SegmentDensityArtist, self).__init__(ax,
+                                                   histogram2d_func=self.histogram2d_helper,
+                                                   **kwargs)
+
+    def set_xy(self, x, y):
+        self.histogram2d_helper.set_xy(x, y)
+        self.stale = True
+
+    def on_press(self, event=None, force=False):
+        if not force:
+            if self._update_while_panning and self.histogram2d_helper._downres_factor == 1:
+                return
+        return super(SegmentDensityArtist, self).on_press(force=force)
@@ -0,0 +1,244 @@
+from math import log10
+
+import numpy as np
+
+from .memory import nbytes, track
+
+__all__ = ['SegmentDensityHelper', 'rasterize_segments']
+
+# The maximum number of samples along segments to process at once, which
+# limits the memory used when rasterizing long segments.
+CHUNK_SIZE = 2 ** 21
+
+
+def _clip_segments(x0, y0, x1, y1, nx, ny):
+    # Clip segments in pixel coordinates to the image using the Liang-Barsky
+    # algorithm, vectorized over all segments.
+    dx = x1 - x0
+    dy = y1 - y0
+    t0 = np.zeros(len(x0))
+    t1 = np.ones(len(x0))
+    keep = np.ones(len(x0), dtype=bool)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for p, q in ((-dx, x0), (dx, nx - x0), (-dy, y0), (dy, ny - y0)):
+            r = q / p
+            keep &= (p != 0) | (q >= 0)
+            t0 = np.where(p < 0, np.maximum(t0, r), t0)
+            t1 = np.where(p > 0, np.minimum(t1, r), t1)
+    keep &= t0 <= t1
+    t0, t1, x0, y0, dx, dy = t0[keep], t1[keep], x0[keep], y0[keep], dx[keep], dy[keep]
+    return x0 + t0 * dx, y0 + t0 * dy, x0 + t1 * dx, y0 + t1 * dy
+
+
+def _rasterize_chunk(x0, y0, x1, y1, nx, ny, counts):
+
+    # Sample each segment at intervals of at most one pixel along its major
+    # axis, which like Bresenham's algorithm visits an 8-connected set of
+    # pixels, then count each pixel at most once per segment.
+
+    steps = np.ceil(np.maximum(np.abs(x1 - x0), np.abs(y1 - y0))).astype(np.intp)
+    nsamples = steps + 1
+
+    segment = np.repeat(np.arange(len(x0)), nsamples)
+    offset = np.repeat(np.cumsum(nsamples) - nsamples, nsamples)
+    t = (np.arange(len(segment)) - offset) / np.maximum(steps, 1)[segment]
+
+    ix = np.floor(x0[segment] + t * (x1 - x0)[segment]).astype(np.intp)
+    iy = np.floor(y0[segment] + t * (y1 - y0)[segment]).astype(np.intp)
+
+    # The end of clipped segments can fall exactly on the upper edge
+    np.clip(ix, 0, nx - 1, out=ix)
+    np.clip(iy, 0, ny - 1, out=iy)
+
+    index = iy * nx + ix
+
+    keep = np.ones(len(index), dtype=bool)
+    keep[1:] = (index[1:] != index[:-1]) | (segment[1:] != segment[:-1])
+
+    counts += np.bincount(index[keep], minlength=nx * ny)
+
+
+def rasterize_segments(x0, y0, x1, y1, bins, range):
+    """
+    Compute the number of segments crossing each pixel.
+
+    Parameters
+    ----------
+    x0, y0, x1, y1 : `~numpy.ndarray`
+        The coordinates of the start and end of each segment.
+    bins : tuple
+        The number of pixels along y and x.
+    range : tuple
+        The ``((ymin, ymax), (xmin, xmax))`` extent of the image.
+    """
+
+    ny, nx = bins
+    (ymin, ymax), (xmin, xmax) = range
+
+    # Convert to pixel coordinates
+    x0 = (x0 - xmin) * (nx / (xmax - xmin))
+    x1 = (x1 - xmin) * (nx / (xmax - xmin))
+    y0 = (y0 - ymin) * (ny / (ymax - ymin))
+    y1 = (y1 - ymin) * (ny / (ymax - ymin))
+
+    finite = np.isfinite(x0) & np.isfinite(x1) & np.isfinite(y0) & np.isfinite(y1)
+    x0, y0, x1, y1 = _clip_segments(x0[finite], y0[finite], x1[finite], y1[finite], nx, ny)
+
+    counts = np.zeros(nx * ny, dtype=np.intp)
+
+    # Process the segments in chunks so that the number of samples held in
+    # memory at any one time is bounded.
+    nsamples = np.ceil(np.maximum(np.abs(x1 - x0), np.abs(y1 - y0))) + 1
+    chunk = (np.cumsum(nsamples) // CHUNK_SIZE).astype(np.intp)
+    edges = np.searchsorted(chunk, np.arange(chunk[-1] + 2) if len(chunk) else [0])
+
+    for start, end in zip(edges[:-1], edges[1:]):
+        if end > start:
+            _rasterize_chunk(x0[start:end], y0[start:end], x1[start:end], y1[start:end],
+                             nx, ny, counts)
+
+    return counts.reshape(bins).astype(float)
+
+
+def _as_segments(x, y):
+    # Convert polylines, which can either be given as lists of arrays or as
+    # arrays with lines separated by NaN values, to arrays of segments.
+    if len(x) > 0 and np.ndim(x[0]) == 1:
+        separator = np.array([np.nan])
+        x = np.concatenate([np.concatenate([line, separator]) for line in x])
+        y = np.concatenate([np.concatenate([line, separator]) for line in y])
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    keep = (np.isfinite(x[:-1]) & np.isfinite(x[1:]) &
+            np.isfinite(y[:-1]) & np.isfinite(y[1:]))
+    return x[:-1][keep], y[:-1][keep], x[1:][keep], y[1:][keep]
+
+
+class SegmentDensityHelper:
+    """
+    Histogram function computing the density of line segments.
+
+    Parameters
+    ----------
+    ax : `matplotlib.axes.Axes`
+        The axes the density map is shown in.
+    x, y : iterable
+        The vertices of the lines, either as lists of 1D arrays (one per
+        line) or as 1D arrays in which separate lines are separated by NaN
+        values, as for :meth:`~matplotlib.axes.Axes.plot`.
+    downres_factor : int
+        The factor by which to reduce the resolution of the density map
+        while panning.
+    """
+
+    compute_when_pressed = True
+
+    # The segments are built from the vertices when the data are set, so
+    # they can't be evicted.
+    non_evictable = ('segments',)
+
+    def __init__(self, ax, x, y, downres_factor=4):
+
+        self.version = 0
+
+        self._ax = ax
+        self._downres = False
+
+        if downres_factor < 1 or downres_factor % 1 != 0:
+            raise ValueError('downres_factor should be a strictly positive integer value')
+
+        self._downres_factor = downres_factor
+
+        self.set_xy(x, y)
+
+    def downres(self):
+        self._downres = True
+
+    def upres(self):
+        self._downres = False
+
+    def set_xy(self, x, y):
+        self.version += 1
+        self._x0, self._y0, self._x1, self._y1 = _as_segments(x, y)
+        self._x0_log = self._x1_log = None
+        self._y0_log = self._y1_log = None
+
+    def memory_usage(self):
+        """
+        Return a dictionary giving the number of bytes held in memory by each
+        of the structures derived from the data. Apart from the ones listed
+        in :attr:`non_evictable`, these can be evicted with :meth:`evict`
+        and are recomputed when needed.
+        """
+        segments = self._x0, self._y0, self._x1, self._y1
+        return {'segments': sum(nbytes(array) for array in segments),
+                'x_log': nbytes(self._x0_log) + nbytes(self._x1_log),
+                'y_log': nbytes(self._y0_log) + nbytes(self._y1_log)}
+
+    def evict(self, name):
+        """
+        Discard one of the structures listed by :meth:`memory_usage`.
+        """
+        if name == 'x_log':
+            self._x0_log = self._x1_log = None
+        elif name == 'y_log':
+            self._y0_log = self._y1_log = None
+        elif name in self.non_evictable:
+            raise ValueError('{0!r} cannot be evicted'.format(name))
+        else:
+            raise KeyError('Unknown structure: {0!r}'.format(name))
+
+    def _update_x_log(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self._x0_log = np.log10(self._x0)
+            self._x1_log = np.log10(self._x1)
+
+    def _update_y_log(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self._y0_log = np.log10(self._y0)
+            self._y1_log = np.log10(self._y1)
+
+    def __call__(self, bins=None, range=None):
+
+        ny, nx = bins
+        (ymin, ymax), (xmin, xmax) = range
+
+        # Matplotlib draws straight lines between vertices in display space,
+        # so on log axes segments are straight lines in log space.
+
+        xscale = self._ax.get_xscale()
+        yscale = self._ax.get_yscale()
+
+        if xscale == 'log':
+            xmin, xmax = log10(xmin), log10(xmax)
+            if self._x0_log is None:
+                self._update_x_log()
+            x0, x1 = self._x0_log, self._x1_log
+        elif xscale == 'linear':
+            x0, x1 = self._x0, self._x1
+        else:  # pragma: nocover
+            raise ValueError('Unexpected xscale: {0}'.format(xscale))
+
+        if yscale == 'log':
+            ymin, ymax = log10(ymin), log10(ymax)
+            if self._y0_log is None:
+                self._update_y_log()
+            y0, y1 = self._y0_log, self._y1_log
+        elif yscale == 'linear':
+            y0, y1 = self._y0, self._y1
+        else:  # pragma: nocover
+            raise ValueError('Unexpected yscale: {0}'.format(yscale))
+
+        # The cost of rasterizing segments scales with the number of pixels
+        # they cross, so when panning we just need to reduce the resolution.
+        if self._downres:
+            bins = (max(ny // self._downres_factor, 1), max(nx // self._downres_factor, 1))
+
+        array = rasterize_segments(x0, y0, x1, y1, bins=bins,
+                                   range=((ymin, ymax), (xmin, xmax)))
+
+        # We only enforce the memory budget once the array has been computed
+        # since the log10 arrays might otherwise get evicted while in use.
+        track(self)
+
+        return array
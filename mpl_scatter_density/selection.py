@@ -0,0 +1,149 @@
+"""
+Functions to find which points fall inside a region.
+
+All functions return boolean masks and work on coordinates in the space
+in which the binning is done (i.e. log10 of the values for log axes). The
+points are processed in chunks by several threads, which works well since
+NumPy releases the GIL for operations on large arrays.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .reducers import bin_index
+from .segment_density_helper import rasterize_segments
+
+__all__ = ['rectangle_mask', 'polygon_mask', 'points_in_polygon']
+
+# The number of points processed at once by each thread
+CHUNK_SIZE = 2 ** 20
+
+# The number of cells along each direction of the grid used to find which
+# points need to be tested exactly against polygons.
+GRID_SIZE = 256
+
+
+def _parallel_mask(func, x, y):
+    # Compute func(x, y) in chunks, using several threads if there are
+    # enough points.
+
+    mask = np.empty(len(x), dtype=bool)
+
+    def process(start):
+        end = start + CHUNK_SIZE
+        mask[start:end] = func(x[start:end], y[start:end])
+
+    starts = np.arange(0, len(x), CHUNK_SIZE)
+
+    if len(starts) > 1:
+        with ThreadPoolExecutor(max_workers=min(len(starts), os.cpu_count() or 1)) as executor:
+            list(executor.map(process, starts))
+    elif len(starts) == 1:
+        process(0)
+
+    return mask
+
+
+def rectangle_mask(x, y, xmin, xmax, ymin, ymax):
+    """
+    Return a mask of the points inside the rectangle, including its edges.
+    """
+    return _parallel_mask(lambda x, y: (x >= xmin) & (x <= xmax) & (y >= ymin) & (y <= ymax),
+                          x, y)
+
+
+def points_in_polygon(x, y, vx, vy):
+    """
+    Return a mask of the points inside the polygon with vertices ``(vx, vy)``
+    using the even-odd rule.
+
+    The points are sorted by ``y`` so that for each edge of the polygon, the
+    points whose horizontal ray might cross the edge are a contiguous slice,
+    which means that each point is only tested against the edges that span
+    its ``y`` value.
+    """
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    order = np.argsort(y)
+    xs, ys = x[order], y[order]
+
+    inside = np.zeros(x.shape, dtype=bool)
+
+    for x0, y0, x1, y1 in zip(vx, vy, np.roll(vx, -1), np.roll(vy, -1)):
+        if y0 == y1:
+            continue
+        # Count the crossings of a ray going from each point towards +x,
+        # for points with min(y0, y1) <= y < max(y0, y1)
+        start, end = np.searchsorted(ys, sorted((y0, y1)), side='left')
+        xc = x0 + (ys[start:end] - y0) * ((x1 - x0) / (y1 - y0))
+        inside[start:end] ^= xs[start:end] < xc
+
+    result = np.empty(x.shape, dtype=bool)
+    result[order] = inside
+
+    return result
+
+
+def polygon_mask(x, y, vx, vy):
+    """
+    Return a mask of the points inside the polygon with vertices ``(vx, vy)``
+    using the even-odd rule.
+
+    The polygon is first rasterized on a grid covering its bounding box, and
+    grid cells crossed by the edges are marked as boundary cells. Points in
+    other cells are inside or outside depending on the center of the cell,
+    so only the points in boundary cells need to be tested exactly.
+    """
+
+    vx = np.asarray(vx, dtype=float)
+    vy = np.asarray(vy, dtype=float)
+
+    xmin, xmax = vx.min(), vx.max()
+    ymin, ymax = vy.min(), vy.max()
+
+    if not (xmax > xmin and ymax > ymin):
+        return np.zeros(len(x), dtype=bool)
+
+    # Leave a margin of half a cell around the polygon so that points on
+    # the edges of the bounding box fall inside boundary cells.
+    n = GRID_SIZE
+    dx = (xmax - xmin) / (n - 1)
+    dy = (ymax - ymin) / (n - 1)
+    grid_range = ((ymin - dy / 2, ymax + dy / 2), (xmin - dx / 2, xmax + dx / 2))
+
+    boundary = rasterize_segments(vx, vy, np.roll(vx, -1), np.roll(vy, -1),
+                                  bins=(n, n), range=grid_range) > 0
+
+    # The rasterization visits an 8-connected set of cells along each edge,
+    # which can miss cells where an edge cuts through a corner, so we also
+    # mark the neighbors of all boundary cells.
+    padded = np.pad(boundary, 1)
+    boundary = np.zeros((n, n), dtype=bool)
+    for i in (0, 1, 2):
+        for j in (0, 1, 2):
+            boundary |= padded[i:i + n, j:j + n]
+    boundary = boundary.ravel()
+
+    xc = grid_range[1][0] + (np.arange(n) + 0.5) * dx
+    yc = grid_range[0][0] + (np.arange(n) + 0.5) * dy
+    xc, yc = np.meshgrid(xc, yc)
+
+    # The status of each cell is 0 for outside, 1 for inside, and 2 for
+    # boundary cells, with an extra element for points outside the grid.
+    status = np.zeros(n * n + 1, dtype=np.int8)
+    status[:-1][~boundary] = points_in_polygon(xc.ravel()[~boundary], yc.ravel()[~boundary],
+                                               vx, vy)
+    status[:-1][boundary] = 2
+
+    def classify(x, y):
+        cell = status[bin_index(x, y, (n, n), grid_range)]
+        mask = cell == 1
+        edge = cell == 2
+        mask[edge] = points_in_polygon(x[edge], y[edge], vx, vy)
+        return mask
+
+    return _parallel_mask(classify, x, y)
@@ -0,0 +1,102 @@
+"""
+Sparse density maps.
+
+At high zoom levels or for clustered data, most pixels of density maps are
+empty (zero or NaN). :class:`SparseDensity` stores only the occupied pixels,
+and is understood by the density artists, which then only need to normalize
+and color-map the occupied pixels.
+"""
+
+import numpy as np
+
+__all__ = ['SparseDensity']
+
+
+class SparseDensity:
+    """
+    Density map storing only the pixels that differ from a fill value.
+
+    Parameters
+    ----------
+    shape : tuple
+        The ``(ny, nx)`` shape of the density map.
+    index : `~numpy.ndarray`
+        The flat index of the occupied pixels.
+    values : `~numpy.ndarray`
+        The values of the occupied pixels.
+    fill_value : float
+        The value of all other pixels.
+    """
+
+    ndim = 2
+
+    def __init__(self, shape, index, values, fill_value=0.):
+        self.shape = tuple(shape)
+        self.index = np.asarray(index)
+        self.values = np.asarray(values)
+        self.fill_value = fill_value
+
+    @classmethod
+    def from_array(cls, array, fill_value=None):
+        """
+        Create a sparse density map from a dense array. If ``fill_value`` is
+        not specified, the most common of zero and NaN is used.
+        """
+        array = np.asarray(array)
+        flat = array.ravel()
+        if fill_value is None:
+            n_nan = np.count_nonzero(np.isnan(flat))
+            fill_value = np.nan if n_nan > flat.size - np.count_nonzero(flat) else 0
+        if np.isnan(fill_value):
+            occupied = ~np.isnan(flat)
+        else:
+            occupied = flat != fill_value
+        index = np.flatnonzero(occupied)
+        return cls(array.shape, index, flat[index], fill_value=fill_value)
+
+    @property
+    def dtype(self):
+        return self.values.dtype
+
+    @property
+    def size(self):
+        return self.shape[0] * self.shape[1]
+
+    @property
+    def nbytes(self):
+        return self.index.nbytes + self.values.nbytes
+
+    def copy(self):
+        return SparseDensity(self.shape, self.index.copy(), self.values.copy(),
+                             fill_value=self.fill_value)
+
+    def toarray(self):
+        """
+        Return the equivalent dense array.
+        """
+        array = np.full(self.size, self.fill_value, dtype=np.result_type(self.values,
+                                                                         self.fill_value))
+        array[self.index] = self.values
+        return array.reshape(self.shape)
+
+    def __array__(self, dtype=None, copy=None):
+        array = self.toarray()
+        if dtype is not None:
+            array = array.astype(dtype)
+        return array
+
+    def flip(self, x=False, y=False):
+        """
+        Return the density map flipped along x and/or y.
+        """
+        ny, nx = self.shape
+        iy, ix = np.divmod(self.index, nx)
+        if x:
+            ix = nx - 1 - ix
+        if y:
+            iy = ny - 1 - iy
+        index = iy * nx + ix
+        # Keep the index sorted, which makes filling arrays faster
+        order = np.argsort(index)
+        return SparseDensity(self.shape, index[order], self.values[order],
+                             fill_value=self.fill_value)
@@ -1,5 +1,7 @@
 import pytest
+import numpy as np
 
+from matplotlib.backend_bases import TimerBase
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_agg import FigureCanvasAgg
 
@@ -10,7 +12,9 @@ except ImportError:
 else:
     QT_INSTALLED = True
 
-from ..base_image_artist import supports_resize
+from ..base_image_artist import BaseImageArtist, supports_resize
+from ..fixed_data_density_helper import FixedDataDensityHelper
+from ..timers import Debouncer, new_timer
 
 
 def test_supports_resize():
@@ -34,3 +38,92 @@ def test_supports_resize_qt():
         pass
     canvas = SubclassB(Figure())
     assert supports_resize(canvas)
+
+
+class ManualTimer(TimerBase):
+    # Timer that is only triggered explicitly, to make tests deterministic
+
+    def _timer_start(self):
+        self.running = True
+
+    def _timer_stop(self):
+        self.running = False
+
+    def fire(self):
+        self.running = False
+        self._on_timer()
+
+
+def test_debouncer():
+
+    # The Agg canvas doesn't have a functional timer
+    canvas = FigureCanvasAgg(Figure())
+    assert new_timer(canvas, 100) is None
+
+    timer = ManualTimer(interval=100)
+    calls = []
+    debouncer = Debouncer(timer, lambda: calls.append(1))
+
+    for i in range(5):
+        debouncer()
+        assert timer.running
+
+    assert len(calls) == 0
+    timer.fire()
+    assert len(calls) == 1
+
+    debouncer()
+    debouncer.stop()
+    assert not timer.running
+
+
+def test_resize_agg():
+
+    # Canvases without a working timer should not switch to low resolution
+    # when resizing, since nothing would switch back to full resolution.
+
+    fig = Figure(figsize=(3, 3))
+    canvas = FigureCanvasAgg(fig)
+    ax = fig.add_subplot(1, 1, 1)
+
+    x = np.random.normal(0, 1, 10000)
+    a = BaseImageArtist(ax, array_func=FixedDataDensityHelper(ax, x, x))
+    ax.add_artist(a)
+    canvas.draw()
+
+    canvas.callbacks.process('resize_event', None)
+    assert not a._pressed
+
+
+def test_resize_timer():
+
+    fig = Figure(figsize=(3, 3))
+    canvas = FigureCanvasAgg(fig)
+    timers = []
+
+    def manual_timer(interval=None):
+        timers.append(ManualTimer(interval=interval))
+        return timers[-1]
+
+    canvas.new_timer = manual_timer
+    ax = fig.add_subplot(1, 1, 1)
+
+    x = np.random.normal(0, 1, 10000)
+    a = BaseImageArtist(ax, array_func=FixedDataDensityHelper(ax, x, x))
+    ax.add_artist(a)
+    canvas.draw()
+    assert a.compute_count == 1
+
+    # Bursts of resize events should be coalesced into a single computation
+    # at full resolution once the events stop.
+    for i in range(3):
+        canvas.callbacks.process('resize_event', None)
+        assert a._pressed
+        canvas.draw()
+
+    # Firing the timer switches back to full resolution and redraws
+    timers[0].fire()
+
+    assert not a._pressed
+    assert a.compute_count == 3
+    assert a.skip_count == 2
@@ -0,0 +1,109 @@
+# Conformance tests to make sure that all binning engines give the same
+# results.
+
+import pytest
+import numpy as np
+from numpy.testing import assert_allclose, assert_equal
+
+from ..engines import ENGINES, get_engine, FastHistogramEngine, NUMBA_THRESHOLD
+from ..reducers import bin_index
+
+AVAILABLE = [name for name, cls in sorted(ENGINES.items()) if cls.is_available()]
+
+BINS = [(17, 23), (1, 1), (200, 100)]
+RANGES = [((-1, 1), (-2, 2)), ((0.5, 0.7), (-0.3, 0.1))]
+
+
+def make_data(n=100000, dtype=float):
+    random = np.random.RandomState(12345)
+    # We round the values so that many points fall exactly on pixel edges
+    x = np.round(random.normal(0, 1, n), 2).astype(dtype)
+    y = np.round(random.normal(0, 1, n), 2).astype(dtype)
+    w = random.uniform(-1, 1, n)
+    x[::37] = np.nan
+    y[::41] = np.inf
+    return x, y, w
+
+
+@pytest.mark.parametrize('engine', AVAILABLE)
+@pytest.mark.parametrize('bins', BINS)
+@pytest.mark.parametrize('range', RANGES)
+@pytest.mark.parametrize('dtype', [np.float32, np.float64])
+def test_histogram2d(engine, bins, range, dtype):
+    x, y, w = make_data(dtype=dtype)
+    reference = FastHistogramEngine()
+    engine = get_engine(engine)
+    assert_equal(engine.histogram2d(x, y, bins, range),
+                 reference.histogram2d(x, y, bins, range))
+    # The order of the summation can differ for the weighted histograms
+    assert_allclose(engine.histogram2d(x, y, bins, range, weights=w),
+                    reference.histogram2d(x, y, bins, range, weights=w),
+                    rtol=1e-10, atol=1e-10)
+
+
+@pytest.mark.parametrize('engine', AVAILABLE)
+@pytest.mark.parametrize('bins', BINS)
+@pytest.mark.parametrize('range', RANGES)
+@pytest.mark.parametrize('dtype', [np.float32, np.float64])
+def test_bin_index(engine, bins, range, dtype):
+    x, y, w = make_data(dtype=dtype)
+    engine = get_engine(engine)
+    assert_equal(engine.bin_index(x, y, bins, range), bin_index(x, y, bins, range))
+
+
+@pytest.mark.parametrize('engine', AVAILABLE)
+def test_integer(engine):
+    # Integer values should be converted to floats by all engines
+    x = np.arange(-5, 5)
+    engine = get_engine(engine)
+    assert_equal(engine.histogram2d(x, x, (10, 10), ((-5, 5), (-5, 5)), weights=x),
+                 FastHistogramEngine().histogram2d(x, x, (10, 10), ((-5, 5), (-5, 5)),
+                                                   weights=x))
+
+
+@pytest.mark.parametrize('engine', AVAILABLE)
+def test_strided(engine):
+    # Subsets used when panning are strided views of the original arrays
+    x, y, w = make_data()
+    engine = get_engine(engine)
+    assert_equal(engine.histogram2d(x[::7], y[::7], (10, 10), RANGES[0]),
+                 FastHistogramEngine().histogram2d(x[::7], y[::7], (10, 10), RANGES[0]))
+
+
+def test_get_engine():
+
+    assert isinstance(get_engine('auto', 10), FastHistogramEngine)
+    assert get_engine('auto', NUMBA_THRESHOLD).name == AVAILABLE[-1]
+
+    engine = FastHistogramEngine()
+    assert get_engine(engine) is engine
+
+    with pytest.raises(ValueError) as exc:
+        get_engine('apple')
+    assert exc.value.args[0] == 'engine should be one of: auto, fast_histogram, numba'
+
+
+@pytest.mark.skipif('numba' not in AVAILABLE, reason='numba is not installed')
+def test_numba_partial_size(monkeypatch):
+
+    # The number of per-thread histograms should be limited for large images
+
+    import numba
+    from .. import engines
+
+    histogram2d_kernel, bin_index_kernel = engines._numba_kernels()
+    nchunks = []
+
+    def kernel(*args):
+        nchunks.append(args[-1])
+        return histogram2d_kernel(*args)
+
+    monkeypatch.setattr(engines, '_numba_kernels', lambda: (kernel, bin_index_kernel))
+    monkeypatch.setattr(engines, 'MAX_PARTIAL_SIZE', 200 * 100 * 2)
+    monkeypatch.setattr(numba, 'get_num_threads', lambda: 8)
+
+    x, y, w = make_data(n=1000000)
+    engine = get_engine('numba')
+    assert_equal(engine.histogram2d(x, y, (200, 100), RANGES[0]),
+                 FastHistogramEngine().histogram2d(x, y, (200, 100), RANGES[0]))
+    assert nchunks[-1] == 2
@@ -0,0 +1,272 @@
+import pytest
+import numpy as np
+from numpy.testing import assert_allclose, assert_equal
+
+from matplotlib.figure import Figure
+
+from ..cache import hash_array
+from ..fixed_data_density_helper import FixedDataDensityHelper
+from ..memory import get_memory_budget, set_memory_budget, total_memory_usage
+from ..sparse import SparseDensity
+
+
+class TestFixedDataDensityHelper(object):
+
+    def setup_class(self):
+        np.random.seed(12345)
+        self.x = np.random.uniform(1, 10, 100000)
+        self.y = np.random.uniform(1, 10, 100000)
+
+    def setup_method(self, method):
+        self.fig = Figure()
+        self.ax = self.fig.add_subplot(1, 1, 1)
+
+    def test_hash_array(self):
+        assert hash_array(self.x) == hash_array(self.x.copy())
+        assert hash_array(self.x) != hash_array(self.y)
+        assert hash_array(self.x) != hash_array(self.x.astype(np.float32))
+        # Changing any element, or the order of the elements, should change
+        # the hash
+        x = self.x.copy()
+        x[12345] += 1
+        assert hash_array(x) != hash_array(self.x)
+        x = self.x.copy()
+        x[1], x[2] = x[2], x[1]
+        assert hash_array(x) != hash_array(self.x)
+        assert hash_array(self.x[::-1]) != hash_array(self.x)
+
+    def test_hash_array_chunks(self, monkeypatch):
+        # The hash should cover all chunks, in order
+        from .. import cache
+        monkeypatch.setattr(cache, 'CHUNK_SIZE', 1024)
+        x = self.x.copy()
+        x[1], x[-2] = x[-2], x[1]
+        assert hash_array(x) != hash_array(self.x)
+        x = self.x.copy()
+        x[:128], x[128:256] = self.x[128:256], self.x[:128]
+        assert hash_array(x) != hash_array(self.x)
+
+    def test_cache(self, tmp_path):
+
+        self.ax.set_xscale('log')
+        self.ax.set_yscale('log')
+
+        helper1 = FixedDataDensityHelper(self.ax, self.x, self.y, cache_dir=tmp_path)
+        expected = helper1(bins=(30, 20), range=((1, 10), (1, 10)))
+        bounds = helper1.get_bounds()
+        assert len(list(tmp_path.iterdir())) == 2
+
+        # A new helper with the same data should find the cached arrays and
+        # memory-map them rather than recomputing them.
+        helper2 = FixedDataDensityHelper(self.ax, self.x.copy(), self.y.copy(),
+                                         cache_dir=tmp_path)
+        assert helper2.get_bounds() == bounds
+        assert_equal(helper2(bins=(30, 20), range=((1, 10), (1, 10))), expected)
+        assert isinstance(helper2._x_log, np.memmap)
+        assert isinstance(helper2._y_log, np.memmap)
+
+        # Changing the data should not re-use the previous arrays
+        helper2.set_xy(self.y, self.x)
+        assert helper2.get_bounds() == (bounds[2], bounds[3], bounds[0], bounds[1])
+        assert len(list(tmp_path.iterdir())) == 2
+
+    def test_reduce(self):
+
+        c = self.x * self.y
+
+        self.ax.set_xscale('log')
+
+        helper = FixedDataDensityHelper(self.ax, self.x, self.y, c=c,
+                                        downres_factor=2, reduce='max')
+        helper.downres()
+        array = helper(bins=(30, 20), range=((1, 10), (1, 10)))
+        assert array.shape == (15, 10)
+
+        # Each pixel should contain the maximum value of the subset of points
+        # used when panning
+        x, y, c = np.log10(self.x[::4]), self.y[::4], c[::4]
+        ix = ((x - 0) / (1 - 0) * 10).astype(int)
+        iy = ((y - 1) / (10 - 1) * 15).astype(int)
+        expected = np.full((15, 10), -np.inf)
+        np.maximum.at(expected, (iy, ix), c)
+        assert_equal(array, expected)
+
+        version = helper.version
+        helper.set_reduce('count')
+        assert helper.version > version
+        helper.upres()
+        assert_equal(helper(bins=(30, 20), range=((1, 10), (1, 10))),
+                     FixedDataDensityHelper(self.ax, self.x, self.y)(
+                         bins=(30, 20), range=((1, 10), (1, 10))))
+
+    @pytest.mark.parametrize('reduce', ['mean', 'max'])
+    def test_columns(self, reduce):
+
+        c = np.vstack([self.x * self.y, self.x - self.y, self.y]).T
+
+        helper = FixedDataDensityHelper(self.ax, self.x, self.y, c=c, reduce=reduce)
+
+        for column in range(3):
+            expected = FixedDataDensityHelper(self.ax, self.x, self.y,
+                                              c=c[:, column], reduce=reduce)
+            version = helper.version
+            helper.select_column(column)
+            assert helper.version > version
+            assert_allclose(helper(bins=(30, 20), range=((1, 10), (1, 10))),
+                            expected(bins=(30, 20), range=((1, 10), (1, 10))))
+
+        # Switching columns should not require re-binning the data
+        arrays = helper._column_arrays
+        helper.select_column(1)
+        helper(bins=(30, 20), range=((1, 10), (1, 10)))
+        assert helper._column_arrays is arrays
+
+        # but changing the range should
+        helper(bins=(30, 20), range=((1, 10), (2, 10)))
+        assert helper._column_arrays is not arrays
+
+    def test_columns_dict(self):
+
+        helper = FixedDataDensityHelper(self.ax, self.x, self.y,
+                                        c={'a': self.x, 'b': self.y})
+        helper.select_column('b')
+        expected = FixedDataDensityHelper(self.ax, self.x, self.y, c=self.y)
+        assert_allclose(helper(bins=(30, 20), range=((1, 10), (1, 10))),
+                        expected(bins=(30, 20), range=((1, 10), (1, 10))))
+
+        with pytest.raises(KeyError):
+            helper.select_column('c')
+
+        helper.set_c(self.x)
+        with pytest.raises(ValueError) as exc:
+            helper.select_column('a')
+        assert exc.value.args[0] == ('select_column can only be used when c '
+                                     'contains several columns')
+
+    def test_cache_indices(self):
+
+        helper = FixedDataDensityHelper(self.ax, self.x, self.y, c=self.x,
+                                        cache_indices=True)
+        assert helper.index_cache_nbytes == 0
+
+        expected = FixedDataDensityHelper(self.ax, self.x, self.y, c=self.x)
+        assert_allclose(helper(bins=(30, 20), range=((1, 10), (1, 10))),
+                        expected(bins=(30, 20), range=((1, 10), (1, 10))))
+        assert helper.index_cache_nbytes == 4 * len(self.x)
+
+        # Changing only the values should re-use the cached indices
+        index = helper._index_cache[1]
+        helper.set_c(self.y)
+        expected.set_c(self.y)
+        assert_allclose(helper(bins=(30, 20), range=((1, 10), (1, 10))),
+                        expected(bins=(30, 20), range=((1, 10), (1, 10))))
+        assert helper._index_cache[1] is index
+
+        # Changing the limits or data should invalidate the cache
+        helper(bins=(30, 20), range=((1, 10), (2, 10)))
+        assert helper._index_cache[1] is not index
+        helper.set_xy(self.y, self.x)
+        assert helper.index_cache_nbytes == 0
+
+    def test_memory_usage(self):
+
+        self.ax.set_xscale('log')
+
+        helper = FixedDataDensityHelper(self.ax, self.x, self.y, c=self.x,
+                                        cache_indices=True)
+        assert sum(helper.memory_usage().values()) == 0
+
+        expected = helper(bins=(30, 20), range=((1, 10), (1, 10)))
+        assert helper.memory_usage() == {'x_log': 8 * len(self.x), 'y_log': 0,
+                                         'index_cache': 4 * len(self.x),
+                                         'column_arrays': 0}
+
+        helper.evict('x_log')
+        assert helper.memory_usage()['x_log'] == 0
+        assert_equal(helper(bins=(30, 20), range=((1, 10), (1, 10))), expected)
+
+        with pytest.raises(KeyError):
+            helper.evict('apple')
+
+    def test_memory_budget(self):
+
+        self.ax.set_xscale('log')
+        self.ax.set_yscale('log')
+
+        helper1 = FixedDataDensityHelper(self.ax, self.x, self.y)
+        expected = helper1(bins=(30, 20), range=((1, 10), (1, 10)))
+
+        helper2 = FixedDataDensityHelper(self.ax, self.x, self.y, compact=True)
+        assert_allclose(helper2(bins=(30, 20), range=((1, 10), (1, 10))), expected,
+                        atol=2)
+        assert helper2.memory_usage()['x_log'] == 4 * len(self.x)
+
+        # Setting a budget should evict arrays from the least recently used
+        # helper first
+        set_memory_budget(helper2.memory_usage()['x_log'] * 2)
+        try:
+            assert get_memory_budget() == 8 * len(self.x)
+            assert total_memory_usage() <= get_memory_budget()
+            assert sum(helper1.memory_usage().values()) == 0
+            assert sum(helper2.memory_usage().values()) == 8 * len(self.x)
+            # and evicted arrays should be recomputed as needed
+            assert_equal(helper1(bins=(30, 20), range=((1, 10), (1, 10))), expected)
+            assert sum(helper2.memory_usage().values()) == 0
+        finally:
+            set_memory_budget(None)
+
+    @pytest.mark.parametrize('cache_indices', [False, True])
+    def test_select(self, cache_indices):
+
+        self.ax.set_xscale('log')
+
+        helper = FixedDataDensityHelper(self.ax, self.x, self.y,
+                                        cache_indices=cache_indices)
+
+        expected = np.flatnonzero((self.x >= 2) & (self.x <= 5) &
+                                  (self.y >= 3) & (self.y <= 4))
+        assert_equal(helper.select_rectangle(2, 5, 3, 4), expected)
+        assert helper.select_rectangle(2, 5, 3, 4, count=True) == len(expected)
+
+        # On log axes, polygons edges are straight in log space
+        vertices = [(1, 1), (10, 1), (1, 10)]
+        expected = np.flatnonzero(np.log10(self.x) + (self.y - 1) / 9 < 1)
+        assert_equal(helper.select_polygon(vertices), expected)
+
+        # The number of points in a set of pixels should match the density map
+        array = helper(bins=(30, 20), range=((1, 10), (1, 10)))
+        mask = np.zeros((30, 20), dtype=bool)
+        mask[5:12, 3:7] = True
+        mask[20, 15] = True
+        assert helper.select_pixels(mask, ((1, 10), (1, 10)), count=True) == array[mask].sum()
+
+    def test_sparse_dtype(self):
+
+        expected = FixedDataDensityHelper(self.ax, self.x, self.y)(bins=(30, 20),
+                                                                   range=((1, 10), (9, 20)))
+
+        helper = FixedDataDensityHelper(self.ax, self.x, self.y, sparse=True, dtype=np.int32)
+        array = helper(bins=(30, 20), range=((1, 10), (9, 20)))
+        assert isinstance(array, SparseDensity)
+        assert array.dtype == np.int32
+        assert len(array.values) < array.size / 2
+        assert_equal(array.toarray(), expected)
+
+    def test_integer_dtype(self):
+
+        # Integer dtypes are only allowed for maps of counts, since other maps
+        # can contain NaN values.
+
+        with pytest.raises(ValueError, match='Integer dtypes can only be used'):
+            FixedDataDensityHelper(self.ax, self.x, self.y, c=self.x, dtype=np.int32)
+
+        helper = FixedDataDensityHelper(self.ax, self.x, self.y, c=self.x, dtype=np.int32,
+                                        reduce='count')
+        array = helper(bins=(30, 20), range=((1, 10), (9, 20)))
+        assert array.dtype == np.int32
+
+        # Approximate distinct counts are fractional, so they are not allowed
+        for reduce in ('mean', 'count_distinct'):
+            helper.set_reduce(reduce)
+            with pytest.raises(ValueError, match='Integer dtypes can only be used'):
+                helper(bins=(30, 20), range=((1, 10), (9, 20)))
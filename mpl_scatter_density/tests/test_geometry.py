@@ -0,0 +1,97 @@
+import pytest
+import numpy as np
+from numpy.testing import assert_equal
+
+from matplotlib.figure import Figure
+
+from ..fixed_data_density_helper import FixedDataDensityHelper
+from ..geometry import HexGeometry, PolarGeometry, get_geometry
+
+
+def pixel_centers(bins, range):
+    ny, nx = bins
+    (ymin, ymax), (xmin, xmax) = range
+    xc = xmin + (np.arange(nx) + 0.5) * ((xmax - xmin) / nx)
+    yc = ymin + (np.arange(ny) + 0.5) * ((ymax - ymin) / ny)
+    xc, yc = np.meshgrid(xc, yc)
+    return xc.ravel(), yc.ravel()
+
+
+def test_hex_area():
+
+    # All hexagons fully inside the image should contain the same number of
+    # pixels (up to rounding), independently of the image resolution
+
+    for bins in [(200, 300), (50, 75)]:
+
+        geometry = HexGeometry(gridsize=10)
+        index, ncells = geometry.cell_index(*pixel_centers(bins, ((0, 2), (0, 3))),
+                                            bins=bins, range=((0, 2), (0, 3)))
+
+        assert index.min() >= 0 and index.max() < ncells
+
+        area = np.bincount(index, minlength=ncells)
+
+        image = index.reshape(bins)
+        edges = np.unique(np.hstack([image[0], image[-1], image[:, 0], image[:, -1]]))
+        interior = np.setdiff1d(np.unique(index), edges)
+
+        expected = 3 * np.sqrt(3) / 2 * (bins[1] / 10 / np.sqrt(3)) ** 2
+        assert len(interior) > 20
+        assert np.all(np.abs(area[interior] / expected - 1) < 0.1)
+
+
+def test_polar():
+
+    theta = np.linspace(-np.pi, np.pi, 1000, endpoint=False)
+    x = 0.75 * np.cos(theta)
+    y = 0.75 * np.sin(theta)
+
+    geometry = PolarGeometry(nr=2, ntheta=4, rmax=1)
+    index, ncells = geometry.cell_index(x, y, bins=(10, 10), range=((-1, 1), (-1, 1)))
+    assert ncells == 8
+    assert_equal(np.bincount(index, minlength=9), [0, 0, 0, 0, 250, 250, 250, 250, 0])
+
+    fig = Figure()
+    ax = fig.add_subplot(1, 1, 1)
+    helper = FixedDataDensityHelper(ax, x, y, geometry=geometry)
+    array = helper(bins=(20, 20), range=((-1, 1), (-1, 1)))
+
+    xc, yc = pixel_centers((20, 20), ((-1, 1), (-1, 1)))
+    r = np.hypot(xc, yc).reshape((20, 20))
+    assert_equal(array[r < 0.5], 0)
+    assert_equal(array[(r > 0.5) & (r < 1)], 250)
+    assert np.all(np.isnan(array[r > 1]))
+
+
+def test_helper_hex():
+
+    random = np.random.RandomState(12345)
+    x = random.uniform(0, 1, 100000)
+    y = random.uniform(0, 1, 100000)
+    c = random.uniform(0, 1, 100000)
+
+    fig = Figure()
+    ax = fig.add_subplot(1, 1, 1)
+
+    helper = FixedDataDensityHelper(ax, x, y, c=c, geometry=HexGeometry(gridsize=5),
+                                    reduce='max', downres_factor=2)
+    array = helper(bins=(100, 100), range=((0, 1), (0, 1)))
+
+    # Each hexagon is filled with a single value
+    assert len(np.unique(array)) < 50
+    assert np.nanmax(array) == np.max(c)
+
+    # The hexagons should be the same when panning
+    helper.downres()
+    assert len(np.unique(helper(bins=(100, 100), range=((0, 1), (0, 1))))) < 50
+
+
+def test_get_geometry():
+    assert get_geometry(None) is None
+    assert isinstance(get_geometry('hex'), HexGeometry)
+    geometry = PolarGeometry()
+    assert get_geometry(geometry) is geometry
+    with pytest.raises(ValueError) as exc:
+        get_geometry('triangle')
+    assert exc.value.args[0] == 'geometry should be one of: hex, polar'
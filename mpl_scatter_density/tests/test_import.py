@@ -0,0 +1,22 @@
+import sys
+import subprocess
+
+import pytest
+
+LAZY_MODULES = ['matplotlib.pyplot', 'fast_histogram']
+
+
+@pytest.mark.parametrize('module', LAZY_MODULES)
+def test_lazy_import(module):
+
+    # Importing the package should register the projection without importing
+    # pyplot (which selects and loads a backend) or the binning engine.
+
+    code = ('import sys, mpl_scatter_density; '
+            'from matplotlib.projections import get_projection_class; '
+            'get_projection_class("scatter_density"); '
+            'print({0!r} in sys.modules)'.format(module))
+
+    output = subprocess.check_output([sys.executable, '-c', code])
+
+    assert output.decode().strip() == 'False'
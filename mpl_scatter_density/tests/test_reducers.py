@@ -0,0 +1,88 @@
+import pytest
+import numpy as np
+from numpy.testing import assert_allclose, assert_equal
+
+from fast_histogram import histogram2d
+
+from ..reducers import bin_index, get_reducer, quantile, REDUCERS
+
+BINS = (7, 9)
+RANGE = ((-1, 1), (-2, 2))
+SIZE = BINS[0] * BINS[1]
+
+REFERENCE = {'count': len,
+             'sum': np.sum,
+             'mean': np.mean,
+             'var': np.var,
+             'std': np.std,
+             'min': np.min,
+             'max': np.max,
+             'first': lambda v: v[0],
+             'last': lambda v: v[-1],
+             'median': np.median}
+
+RANDOM = np.random.RandomState(12345)
+X = RANDOM.uniform(-2.5, 2.5, 2000)
+Y = RANDOM.uniform(-1.5, 1.5, 2000)
+X[::50] = np.nan
+C = RANDOM.randint(0, 20, 2000).astype(float)
+
+
+def reference(func, empty=np.nan):
+    # Compute the reduction by explicitly looping over the pixels
+    index = bin_index(X, Y, BINS, RANGE)
+    expected = np.full(SIZE, empty)
+    for i in range(SIZE):
+        values = C[index == i]
+        if len(values) > 0:
+            expected[i] = func(values)
+    return expected
+
+
+def test_bin_index():
+    index = bin_index(X, Y, BINS, RANGE)
+    assert_equal(np.bincount(index, minlength=SIZE + 1)[:SIZE].reshape(BINS),
+                 histogram2d(Y, X, bins=BINS, range=RANGE))
+
+
+@pytest.mark.parametrize('name', sorted(REFERENCE))
+def test_reducers(name):
+    index = bin_index(X, Y, BINS, RANGE)
+    empty = 0 if name in ('count', 'sum') else np.nan
+    assert_allclose(REDUCERS[name](index, C, SIZE),
+                    reference(REFERENCE[name], empty=empty))
+
+
+def test_quantile():
+    index = bin_index(X, Y, BINS, RANGE)
+    assert_allclose(quantile(0.9)(index, C, SIZE),
+                    reference(lambda v: np.quantile(v, 0.9)))
+
+
+def test_count_distinct():
+    index = bin_index(X, Y, BINS, RANGE)
+    expected = reference(lambda v: len(np.unique(v)), empty=0)
+    result = REDUCERS['count_distinct'](index, C, SIZE)
+    # The estimate is approximate for individual pixels but should be
+    # unbiased overall
+    assert np.mean(np.abs(result / expected - 1)) < 0.2
+    assert abs(np.sum(result) / np.sum(expected) - 1) < 0.1
+    # Small counts are close to exact
+    assert_allclose(REDUCERS['count_distinct'](index, np.ones_like(C), SIZE),
+                    np.minimum(expected, 1), atol=0.05)
+
+
+def test_empty():
+    index = np.full(10, SIZE)
+    for name in REDUCERS:
+        assert REDUCERS[name](index, np.ones(10), SIZE).shape == (SIZE,)
+        # and the same should work if there are no points at all
+        assert REDUCERS[name](index[:0], np.ones(0), SIZE).shape == (SIZE,)
+
+
+def test_get_reducer():
+    assert get_reducer('max') is REDUCERS['max']
+    assert get_reducer(np.sum) is np.sum
+    with pytest.raises(ValueError) as exc:
+        get_reducer('apple')
+    assert exc.value.args[0].startswith('reduce should be a callable or one of: count')
@@ -0,0 +1,251 @@
+import time
+import threading
+from multiprocessing import AuthenticationError
+
+import pytest
+import numpy as np
+from numpy.testing import assert_equal
+
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from ..fixed_data_density_helper import FixedDataDensityHelper
+from ..generic_density_artist import GenericDensityArtist
+from .. import remote
+from ..remote import DensityClient, DensityServer, decode_array, encode_array
+from ..sparse import SparseDensity
+
+BINS = (30, 20)
+RANGE = ((1, 10), (1, 10))
+
+RANDOM = np.random.RandomState(12345)
+X = RANDOM.uniform(1, 10, 100000)
+Y = RANDOM.uniform(1, 10, 100000)
+C = X * Y
+
+
+@pytest.mark.parametrize('kind', ['counts', 'mean', 'dense'])
+def test_encode_decode(kind):
+
+    if kind == 'counts':
+        array = np.zeros((30, 20))
+        array[3:5, 10:14] = 12
+    elif kind == 'mean':
+        array = np.full((30, 20), np.nan)
+        array[3:5, 10:14] = 1.5
+    else:
+        array = RANDOM.uniform(0, 1, (30, 20))
+
+    encoded = encode_array(array)
+    assert encoded[0] == ('dense' if kind == 'dense' else 'sparse')
+
+    decoded = decode_array(encoded)
+    assert decoded.dtype == array.dtype
+    assert_equal(decoded, array)
+
+
+def test_server_coalesce(monkeypatch):
+
+    # Identical requests arriving while a density map is being computed
+    # should wait for that computation rather than for the helper.
+
+    server = DensityServer(X, Y)
+
+    computing = threading.Event()
+    release = threading.Event()
+    waiting = threading.Event()
+    calls = []
+
+    compute = server._compute
+
+    def slow_compute(request):
+        with server._lock:
+            calls.append(request)
+            computing.set()
+            release.wait(timeout=10)
+        return compute(request)
+
+    class WatchedFuture(remote.Future):
+        def result(self, timeout=None):
+            waiting.set()
+            return super(WatchedFuture, self).result(timeout=timeout)
+
+    monkeypatch.setattr(server, '_compute', slow_compute)
+    monkeypatch.setattr(remote, 'Future', WatchedFuture)
+
+    request = {'command': 'density', 'bins': BINS, 'range': RANGE, 'xscale': 'linear',
+               'yscale': 'linear', 'downres': False, 'compression': 'zlib'}
+
+    results = []
+    first = threading.Thread(target=lambda: results.append(server._respond(request)))
+    first.start()
+    assert computing.wait(timeout=10)
+
+    second = threading.Thread(target=lambda: results.append(server._respond(request)))
+    second.start()
+    assert waiting.wait(timeout=10)
+
+    release.set()
+    first.join()
+    second.join()
+
+    assert len(calls) == 1
+    assert len(results) == 2
+
+    server.close()
+
+
+def test_server_accept_error(monkeypatch):
+
+    # Persistent errors when accepting connections (e.g. if the process runs
+    # out of file descriptors) should not make the server spin.
+
+    server = DensityServer(X, Y)
+
+    def accept():
+        raise OSError(24, 'Too many open files')
+
+    sleeps = []
+
+    def sleep(delay):
+        sleeps.append(delay)
+        if len(sleeps) == 3:
+            server.close()
+
+    monkeypatch.setattr(server._listener, 'accept', accept)
+    monkeypatch.setattr(remote.time, 'sleep', sleep)
+
+    server.serve_forever()
+
+    assert sleeps == [remote.ACCEPT_RETRY_DELAY] * 3
+
+
+class TestRemote(object):
+
+    def setup_class(self):
+        self.server = DensityServer(X, Y, c=C)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def teardown_class(self):
+        self.server.close()
+        self.thread.join(timeout=5)
+        assert not self.thread.is_alive()
+
+    def setup_method(self, method):
+        self.fig = Figure()
+        self.ax = self.fig.add_subplot(1, 1, 1)
+        self.client = DensityClient(self.ax, self.server.address, authkey=self.server.authkey)
+
+    def teardown_method(self, method):
+        self.client.close()
+
+    @pytest.mark.parametrize(('xscale', 'downres'), [('linear', False), ('log', True)])
+    def test_density(self, xscale, downres):
+
+        self.ax.set_xscale(xscale)
+
+        helper = FixedDataDensityHelper(self.ax, X, Y, c=C)
+        if downres:
+            helper.downres()
+            self.client.downres()
+
+        assert self.client.get_bounds() == helper.get_bounds()
+        assert_equal(self.client(bins=BINS, range=RANGE), helper(bins=BINS, range=RANGE))
+
+    def test_sparse(self):
+
+        client = DensityClient(self.ax, self.server.address, authkey=self.server.authkey,
+                               sparse=True)
+
+        array = client(bins=BINS, range=((1, 10), (9, 20)))
+        assert isinstance(array, SparseDensity)
+        assert_equal(array.toarray(), self.client(bins=BINS, range=((1, 10), (9, 20))))
+
+        client.close()
+
+    def test_cache(self):
+
+        calls = []
+        request = self.client._request
+
+        def slow_request(request_dict):
+            calls.append(request_dict)
+            time.sleep(0.2)
+            return request(request_dict)
+
+        self.client._request = slow_request
+
+        # Identical requests made at the same time should be coalesced
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.client(BINS, RANGE)))
+                   for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(calls) == 1
+        assert len(results) == 4
+
+        # and requests should then be cached
+        self.client(BINS, RANGE)
+        assert len(calls) == 1
+        self.client(BINS, ((1, 10), (2, 10)))
+        assert len(calls) == 2
+
+    def test_error(self):
+        self.ax.set_xscale('log')
+        with pytest.raises(RuntimeError) as exc:
+            self.client(BINS, ((1, 10), (-1, 10)))
+        assert exc.value.args[0].startswith('The server returned an error: ValueError')
+
+    def test_authkey(self):
+        with pytest.raises(AuthenticationError):
+            DensityClient(self.ax, self.server.address, authkey=b'wrong')
+
+    def test_artist(self):
+
+        FigureCanvasAgg(self.fig)
+
+        a = GenericDensityArtist(self.ax, histogram2d_func=self.client)
+        self.ax.add_artist(a)
+        self.ax.set_xlim(1, 10)
+        self.ax.set_ylim(1, 10)
+        self.fig.canvas.draw()
+
+        b = GenericDensityArtist(self.ax, histogram2d_func=FixedDataDensityHelper(self.ax, X, Y,
+                                                                                  c=C))
+        a.set_visible(False)
+        self.ax.add_artist(b)
+        self.fig.canvas.draw()
+
+        assert_equal(a.get_array(), b.get_array())
+
+    def test_artist_pan(self):
+
+        # The artist should request low-resolution maps while panning
+
+        FigureCanvasAgg(self.fig)
+
+        requests = []
+        request = self.client._request
+
+        def record_request(request_dict):
+            requests.append(request_dict)
+            return request(request_dict)
+
+        self.client._request = record_request
+
+        a = GenericDensityArtist(self.ax, histogram2d_func=self.client)
+        self.ax.add_artist(a)
+        self.fig.canvas.draw()
+        assert not requests[-1]['downres']
+
+        a.on_press(force=True)
+        self.ax.set_xlim(2, 9)
+        self.fig.canvas.draw()
+        assert requests[-1]['downres']
+
+        a.on_release()
+        self.fig.canvas.draw()
+        assert not requests[-1]['downres']
@@ -244,6 +244,138 @@ class TestScatterDensity(object):
         a.on_press()
         assert not a.stale
 
+    def test_skip_unchanged(self, tmpdir):
+
+        # Make sure that the density map is only recomputed when one of the
+        # inputs to the histogram function has changed
+
+        a = ScatterDensityArtist(self.ax, self.x1, self.y1)
+        self.ax.add_artist(a)
+        self.ax.set_xlim(-2, 3)
+        self.ax.set_ylim(-2, 3)
+        self.ax.figure.savefig(tmpdir.join('test1.png').strpath)
+        assert (a.compute_count, a.skip_count) == (1, 0)
+
+        # Changing an unrelated artist should not trigger a re-computation
+        self.ax.plot([1, 2], [3, 4])
+        self.ax.figure.savefig(tmpdir.join('test2.png').strpath)
+        assert (a.compute_count, a.skip_count) == (1, 1)
+
+        self.ax.set_xlim(-3, 4)
+        self.ax.figure.savefig(tmpdir.join('test3.png').strpath)
+        assert (a.compute_count, a.skip_count) == (2, 1)
+
+        a.set_c(self.c)
+        assert a.stale
+        self.ax.figure.savefig(tmpdir.join('test4.png').strpath)
+        assert (a.compute_count, a.skip_count) == (3, 1)
+
+        # Releasing the mouse when not panning should not mark the artist
+        # as stale
+        a.on_release()
+        assert not a.stale
+
+    def test_vector_export(self, tmp_path):
+
+        from matplotlib.backends.backend_pdf import PdfPages
+
+        a = ScatterDensityArtist(self.ax, self.x1, self.y1, export_dpi=36)
+        self.ax.add_artist(a)
+        self.ax.set_xlim(-2, 3)
+        self.ax.set_ylim(-2, 3)
+
+        self.fig.savefig(tmp_path / 'test.png')
+        assert a.compute_count == 1
+        assert a.get_size() == (173, 173)
+
+        # The export resolution should be used for vector formats, and saving
+        # several pages with the same density map should only compute and
+        # embed it once.
+        with PdfPages(tmp_path / 'test.pdf') as pdf:
+            for page in range(3):
+                pdf.savefig(self.fig)
+        assert a.compute_count == 2
+        assert a.get_size() == (86, 86)
+        assert (tmp_path / 'test.pdf').read_bytes().count(b'/Subtype /Image') == 1
+
+        # Going back to raster output should re-use the previous array
+        self.fig.savefig(tmp_path / 'test.png')
+        assert a.compute_count == 2
+        assert a.get_size() == (173, 173)
+
+    @pytest.mark.parametrize('sparse', [False, True])
+    def test_select_pixels(self, tmpdir, sparse):
+
+        a = ScatterDensityArtist(self.ax, self.x1, self.y1, sparse=sparse)
+        self.ax.add_artist(a)
+        self.ax.set_xlim(3, -2)
+        self.ax.set_ylim(-2, 3)
+        self.fig.canvas.draw()
+
+        array = a.get_array()
+        mask = np.zeros(array.shape, dtype=bool)
+        mask[:50, :20] = True
+
+        # The mask is in the same orientation as the array shown, which
+        # starts at the top since the origin is 'upper', and at the right
+        # since the x axis is flipped.
+        assert a.select_pixels(mask, count=True) == array[mask].sum()
+        indices = a.select_pixels(mask)
+        assert np.all(self.x1[indices] > 2.4) and np.all(self.y1[indices] > 1.5)
+
+    @pytest.mark.parametrize('values', [False, True])
+    def test_sparse(self, values):
+
+        # Sparse density maps should give the same image as dense ones
+
+        c = self.x1 if values else None
+
+        images = []
+        arrays = []
+        for sparse in (False, True):
+            fig = plt.figure()
+            ax = fig.add_subplot(1, 1, 1)
+            a = ScatterDensityArtist(ax, self.x1, self.y1, c=c, sparse=sparse, dtype=np.float32)
+            ax.add_artist(a)
+            ax.set_xlim(3, -2)
+            ax.set_ylim(-2, 6)
+            fig.canvas.draw()
+            images.append(np.array(fig.canvas.buffer_rgba(), dtype=int))
+            arrays.append(a.get_array())
+            plt.close(fig)
+
+        # get_array should return the density map in both cases
+        assert arrays[1].shape == arrays[0].shape
+        np.testing.assert_equal(arrays[1].filled(np.nan), arrays[0].filled(np.nan))
+
+        # Matplotlib rescales the data before resampling it, which can change
+        # the colors very slightly.
+        np.testing.assert_allclose(images[0], images[1], atol=1)
+
+    def test_time_window(self, tmpdir):
+
+        t = np.arange(len(self.x1))
+
+        a = ScatterDensityArtist(self.ax, self.x1, self.y1, t=t)
+        self.ax.add_artist(a)
+        self.ax.set_xlim(-2, 3)
+        self.ax.set_ylim(-2, 3)
+
+        a.set_time_window(0, 1000)
+        assert a.stale
+        self.fig.canvas.draw()
+        array = a.get_array()
+
+        a.set_visible(False)
+        b = ScatterDensityArtist(self.ax, self.x1[:1000], self.y1[:1000])
+        self.ax.add_artist(b)
+        self.fig.canvas.draw()
+        np.testing.assert_equal(array, b.get_array())
+
+        with pytest.raises(ValueError) as exc:
+            b.set_time_window(0, 1000)
+        assert exc.value.args[0] == 'set_time_window can only be used if t is specified'
+
 
 def test_resize_qt():
 
@@ -0,0 +1,118 @@
+import pytest
+import numpy as np
+from numpy.testing import assert_equal
+
+import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+
+from ..segment_density_artist import SegmentDensityArtist
+from ..segment_density_helper import SegmentDensityHelper, rasterize_segments
+
+RANGE = ((0, 10), (0, 10))
+
+
+def rasterize(x0, y0, x1, y1, bins=(10, 10)):
+    return rasterize_segments(np.array(x0, dtype=float), np.array(y0, dtype=float),
+                              np.array(x1, dtype=float), np.array(y1, dtype=float),
+                              bins=bins, range=RANGE)
+
+
+def test_rasterize_horizontal():
+    array = rasterize([1.5], [2.5], [6.5], [2.5])
+    expected = np.zeros((10, 10))
+    expected[2, 1:7] = 1
+    assert_equal(array, expected)
+
+
+def test_rasterize_diagonal():
+    array = rasterize([0.5, 0.5], [0.5, 0.5], [9.5, 9.5], [9.5, 9.5])
+    assert_equal(array, 2 * np.identity(10))
+
+
+def test_rasterize_clipped():
+    # Segments partially or completely outside the image
+    array = rasterize([-5, 20, 5.5], [4.5, 20, -100], [5.5, 30, 5.5], [4.5, 30, 100])
+    expected = np.zeros((10, 10))
+    expected[4, :6] = 1
+    expected[:, 5] += 1
+    assert_equal(array, expected)
+
+
+def test_rasterize_chunks(monkeypatch):
+    from .. import segment_density_helper
+    random = np.random.RandomState(12345)
+    x0, y0, x1, y1 = random.uniform(-2, 12, (4, 1000))
+    expected = rasterize(x0, y0, x1, y1, bins=(50, 40))
+    monkeypatch.setattr(segment_density_helper, 'CHUNK_SIZE', 100)
+    assert_equal(rasterize(x0, y0, x1, y1, bins=(50, 40)), expected)
+
+
+def test_helper_lines():
+
+    fig = Figure()
+    ax = fig.add_subplot(1, 1, 1)
+
+    # Lines can be given either as lists of arrays or separated by NaN values
+    helper1 = SegmentDensityHelper(ax, [[1.5, 6.5], [1.5, 1.5, 6.5]],
+                                   [[2.5, 2.5], [3.5, 7.5, 7.5]])
+    helper2 = SegmentDensityHelper(ax, [1.5, 6.5, np.nan, 1.5, 1.5, 6.5],
+                                   [2.5, 2.5, np.nan, 3.5, 7.5, 7.5])
+
+    expected = np.zeros((10, 10))
+    expected[2, 1:7] = 1
+    expected[3:8, 1] = 1
+    expected[7, 1:7] = 1
+    # The pixel containing the vertex between two segments is crossed by both
+    expected[7, 1] = 2
+
+    assert_equal(helper1(bins=(10, 10), range=RANGE), expected)
+    assert_equal(helper2(bins=(10, 10), range=RANGE), expected)
+
+    helper1.downres()
+    assert helper1(bins=(10, 10), range=RANGE).shape == (2, 2)
+
+
+def test_helper_memory_usage():
+
+    fig = Figure()
+    ax = fig.add_subplot(1, 1, 1)
+    ax.set_xscale('log')
+
+    helper = SegmentDensityHelper(ax, [1.5, 6.5, np.nan, 1.5, 1.5, 6.5],
+                                  [2.5, 2.5, np.nan, 3.5, 7.5, 7.5])
+    assert helper.memory_usage() == {'segments': 4 * 3 * 8, 'x_log': 0, 'y_log': 0}
+
+    helper(bins=(10, 10), range=((1, 10), (1, 10)))
+    assert helper.memory_usage() == {'segments': 4 * 3 * 8, 'x_log': 2 * 3 * 8, 'y_log': 0}
+
+    helper.evict('x_log')
+    assert helper.memory_usage()['x_log'] == 0
+
+    with pytest.raises(ValueError, match="'segments' cannot be evicted"):
+        helper.evict('segments')
+
+
+class TestSegmentDensity(object):
+
+    def setup_class(self):
+        random = np.random.RandomState(12345)
+        self.x = np.cumsum(random.normal(0, 1, (100, 1000)), axis=1)
+        self.y = np.cumsum(random.normal(0, 1, (100, 1000)), axis=1)
+
+    def setup_method(self, method):
+        self.fig = plt.figure(figsize=(3, 3))
+        self.ax = self.fig.add_axes([0.13, 0.13, 0.8, 0.8])
+
+    def teardown_method(self, method):
+        plt.close(self.fig)
+
+    def test_draw(self, tmpdir):
+        a = SegmentDensityArtist(self.ax, list(self.x), list(self.y), color='red')
+        self.ax.add_artist(a)
+        self.ax.set_xlim(1, 50)
+        self.ax.set_ylim(-50, 50)
+        self.ax.set_xscale('log')
+        self.fig.savefig(tmpdir.join('test.png').strpath)
+        assert a.compute_count == 1
+        assert a.get_array().shape == (173, 173)
+        assert np.nanmax(a.get_array()) > 0
@@ -0,0 +1,54 @@
+import numpy as np
+from numpy.testing import assert_equal
+
+from matplotlib.path import Path
+
+from .. import selection
+from ..selection import points_in_polygon, polygon_mask, rectangle_mask
+
+RANDOM = np.random.RandomState(12345)
+X = RANDOM.uniform(-2, 2, 100000)
+Y = RANDOM.uniform(-2, 2, 100000)
+X[::100] = np.nan
+
+# A concave star-shaped polygon
+ANGLE = np.linspace(0, 2 * np.pi, 11)[:-1]
+RADIUS = np.where(np.arange(10) % 2 == 0, 1.8, 0.6)
+VX = RADIUS * np.cos(ANGLE) + 0.1
+VY = RADIUS * np.sin(ANGLE) - 0.05
+
+
+def reference(vx, vy):
+    path = Path(np.vstack([vx, vy]).T)
+    return path.contains_points(np.vstack([X, Y]).T)
+
+
+def test_points_in_polygon():
+    expected = reference(VX, VY)
+    assert 0 < np.sum(expected) < len(X)
+    assert_equal(points_in_polygon(X, Y, VX, VY), expected)
+
+
+def test_polygon_mask(monkeypatch):
+    # Use small chunks to make sure that several threads are used
+    monkeypatch.setattr(selection, 'CHUNK_SIZE', 1000)
+    assert_equal(polygon_mask(X, Y, VX, VY), reference(VX, VY))
+
+
+def test_polygon_mask_grid_edges():
+    # Points on the edges of the bounding box should be tested exactly
+    vx = np.array([0, 1, 1, 0])
+    vy = np.array([0, 0, 1, 1])
+    x = np.array([0, 0.5, 1, 0.999, 0.5, -0.001])
+    y = np.array([0.5, 0, 0.5, 0.999, 1, 0.5])
+    assert_equal(polygon_mask(x, y, vx, vy), points_in_polygon(x, y, vx, vy))
+
+
+def test_polygon_mask_degenerate():
+    assert not np.any(polygon_mask(X, Y, [0, 1, 2], [0, 0, 0]))
+
+
+def test_rectangle_mask(monkeypatch):
+    monkeypatch.setattr(selection, 'CHUNK_SIZE', 1000)
+    assert_equal(rectangle_mask(X, Y, -1, 0.5, 0, 1.5),
+                 (X >= -1) & (X <= 0.5) & (Y >= 0) & (Y <= 1.5))
@@ -0,0 +1,38 @@
+import pytest
+import numpy as np
+from numpy.testing import assert_equal
+
+from ..sparse import SparseDensity
+
+
+def make_array(fill):
+    array = np.full((7, 9), fill)
+    array[1, 2] = 3
+    array[4, 0:3] = 1.5
+    array[6, 8] = 0.5
+    return array
+
+
+@pytest.mark.parametrize('fill', [0., np.nan])
+def test_from_array(fill):
+    array = make_array(fill)
+    sparse = SparseDensity.from_array(array)
+    assert_equal(sparse.fill_value, fill)
+    assert sparse.shape == (7, 9)
+    assert len(sparse.values) == 5
+    assert_equal(sparse.toarray(), array)
+    assert_equal(np.asarray(sparse), array)
+
+
+def test_flip():
+    array = make_array(0.)
+    sparse = SparseDensity.from_array(array)
+    assert_equal(sparse.flip(x=True).toarray(), array[:, ::-1])
+    assert_equal(sparse.flip(y=True).toarray(), array[::-1, :])
+    assert_equal(sparse.flip(x=True, y=True).toarray(), array[::-1, ::-1])
+
+
+def test_dtype():
+    sparse = SparseDensity.from_array(make_array(np.nan).astype(np.float32))
+    assert sparse.dtype == np.float32
+    assert sparse.toarray().dtype == np.float32
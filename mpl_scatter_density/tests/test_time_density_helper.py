@@ -0,0 +1,159 @@
+import pytest
+import numpy as np
+from numpy.testing import assert_allclose, assert_equal
+
+from matplotlib.figure import Figure
+
+from ..fixed_data_density_helper import FixedDataDensityHelper
+from ..memory import set_memory_budget
+from ..time_density_helper import TimeDensityHelper
+
+BINS = (30, 20)
+RANGE = ((1, 10), (1, 10))
+
+
+class TestTimeDensityHelper(object):
+
+    def setup_class(self):
+        np.random.seed(12345)
+        self.x = np.random.uniform(1, 10, 100000)
+        self.y = np.random.uniform(1, 10, 100000)
+        self.t = np.random.uniform(0, 100, 100000)
+        self.c = self.x * self.y
+
+    def setup_method(self, method):
+        self.fig = Figure()
+        self.ax = self.fig.add_subplot(1, 1, 1)
+
+    def expected(self, t0, t1, c=None, downres=False, **kwargs):
+        # The reference is computed by binning the sorted subset of points
+        # directly, so that the subsets used when panning are the same.
+        order = np.argsort(self.t, kind='stable')
+        t = self.t[order]
+        keep = (t >= t0) & (t < t1)
+        if downres:
+            keep &= np.arange(len(t)) % 16 == 0
+        if c is not None:
+            c = c[order][keep]
+        helper = FixedDataDensityHelper(self.ax, self.x[order][keep], self.y[order][keep],
+                                        c=c, downres_factor=1, **kwargs)
+        bins = (BINS[0] // 4, BINS[1] // 4) if downres else BINS
+        return helper(bins=bins, range=RANGE)
+
+    @pytest.mark.parametrize(('weighted', 'downres'),
+                             [(False, False), (True, False), (False, True), (True, True)])
+    def test_window(self, weighted, downres):
+
+        c = self.c if weighted else None
+
+        helper = TimeDensityHelper(self.ax, self.x, self.y, self.t, c=c, n_blocks=8)
+        if downres:
+            helper.downres()
+
+        for t0, t1 in [(0, 100), (12.3, 56.7), (40, 41), (-5, 30), (70, 200), (50, 50)]:
+            version = helper.version
+            helper.set_time_window(t0, t1)
+            assert helper.version > version
+            assert_allclose(helper(bins=BINS, range=RANGE),
+                            self.expected(t0, t1, c=c, downres=downres))
+
+        # The block histograms should only have been computed once
+        cache = helper._block_cache
+        helper.set_time_window(20, 30)
+        helper(bins=BINS, range=RANGE)
+        assert helper._block_cache is cache
+
+        helper.set_time_window()
+        assert_allclose(helper(bins=BINS, range=RANGE),
+                        self.expected(-np.inf, np.inf, c=c, downres=downres))
+
+    def test_narrow_window(self):
+
+        # Windows that do not contain a whole block should be binned directly
+        # rather than computing the block histograms for the view.
+        helper = TimeDensityHelper(self.ax, self.x, self.y, self.t, n_blocks=8)
+        helper.set_time_window(40, 41)
+        assert_allclose(helper(bins=BINS, range=RANGE), self.expected(40, 41))
+        assert helper._block_cache is None
+
+        helper.set_time_window(10, 60)
+        assert_allclose(helper(bins=BINS, range=RANGE), self.expected(10, 60))
+        assert helper._block_cache is not None
+
+    def test_reduce(self):
+
+        helper = TimeDensityHelper(self.ax, self.x, self.y, self.t, c=self.c, reduce='max')
+        helper.set_time_window(12.3, 56.7)
+        assert_equal(helper(bins=BINS, range=RANGE),
+                     self.expected(12.3, 56.7, c=self.c, reduce='max'))
+        assert helper._block_cache is None
+
+    @pytest.mark.parametrize('reduce', ['first', 'last', 'median'])
+    def test_empty_window(self, reduce):
+        helper = TimeDensityHelper(self.ax, self.x, self.y, self.t, c=self.c, reduce=reduce)
+        helper.set_time_window(5000, 6000)
+        assert np.all(np.isnan(helper(bins=BINS, range=RANGE)))
+
+    def test_memory_usage(self):
+
+        # The sorted copies of the data can't be evicted but should be
+        # reported, unless the times are already sorted.
+
+        helper = TimeDensityHelper(self.ax, self.x, self.y, self.t, c={'a': self.c, 'b': self.c})
+        usage = helper.memory_usage()
+        assert usage['sorted_data'] == 5 * 8 * len(self.x)
+        assert usage['order'] == np.dtype(np.intp).itemsize * len(self.x)
+
+        with pytest.raises(ValueError, match="'order' cannot be evicted"):
+            helper.evict('order')
+
+        # Enforcing a budget should only evict the other structures
+        set_memory_budget(0)
+        try:
+            helper.set_time_window(12.3, 56.7)
+            helper(bins=BINS, range=RANGE)
+            usage = helper.memory_usage()
+            assert usage['block_cache'] == 0
+            assert usage['sorted_data'] == 5 * 8 * len(self.x)
+        finally:
+            set_memory_budget(None)
+
+        helper = TimeDensityHelper(self.ax, self.x, self.y, np.sort(self.t))
+        usage = helper.memory_usage()
+        assert usage['sorted_data'] == usage['order'] == 0
+
+    def test_set_xy(self):
+
+        helper = TimeDensityHelper(self.ax, self.x, self.y, self.t)
+        helper.set_time_window(12.3, 56.7)
+        helper(bins=BINS, range=RANGE)
+
+        assert helper.memory_usage()['block_cache'] == 17 * BINS[0] * BINS[1] * 8
+
+        helper.set_xy(self.y, self.x)
+        assert helper.memory_usage()['block_cache'] == 0
+
+        with pytest.raises(ValueError) as exc:
+            helper.set_xy(self.x[:10], self.y[:10])
+        assert exc.value.args[0] == 'x, y and t should have the same length'
+
+        # The time window should be kept when changing the times
+        helper.set_xy(self.x[:1000], self.y[:1000], t=self.t[:1000])
+        assert helper(bins=BINS, range=RANGE).sum() == np.sum((self.t[:1000] >= 12.3) &
+                                                              (self.t[:1000] < 56.7))
+
+    def test_select(self):
+
+        helper = TimeDensityHelper(self.ax, self.x, self.y, self.t)
+        helper.set_time_window(12.3, 56.7)
+
+        # Only points in the window should be selected, and the indices
+        # should refer to the original order of the points
+        in_window = (self.t >= 12.3) & (self.t < 56.7)
+        expected = np.flatnonzero(in_window & (self.x >= 2) & (self.x <= 5) &
+                                  (self.y >= 3) & (self.y <= 4))
+        assert_equal(helper.select_rectangle(2, 5, 3, 4), expected)
+
+        array = helper(bins=BINS, range=RANGE)
+        mask = array > 100
+        assert helper.select_pixels(mask, RANGE, count=True) == array[mask].sum()
@@ -0,0 +1,260 @@
+import numpy as np
+
+from .engines import get_engine
+from .fixed_data_density_helper import FixedDataDensityHelper
+from .memory import nbytes
+
+__all__ = ['TimeDensityHelper']
+
+
+class TimeDensityHelper(FixedDataDensityHelper):
+    """
+    Histogram function for (x, y) data with a time value for each point,
+    which can show only the points inside a time window.
+
+    The points are sorted by time once, so that the points inside any
+    window are a contiguous slice of the arrays. In addition, when showing
+    counts or mean values in rectangular pixels, the data are split into
+    ``n_blocks`` blocks containing the same number of points, and the
+    cumulative histograms of the blocks are cached for the current view, so
+    that changing the time window only requires binning the points in the
+    partial blocks at the edges of the window.
+
+    Parameters
+    ----------
+    ax : `matplotlib.axes.Axes`
+        The axes the density map is shown in.
+    x, y, t : iterable
+        The coordinates and times of the points.
+    c : iterable or dict
+        Values to use for color-encoding.
+    n_blocks : int
+        The number of time blocks to cache histograms for. Each block uses
+        8 bytes per pixel of the density map (twice that for mean values).
+    kwargs
+        Any additional keyword arguments are passed to
+        :class:`~mpl_scatter_density.fixed_data_density_helper.FixedDataDensityHelper`.
+    """
+
+    # If the times are not sorted, the helper keeps sorted copies of the
+    # data and the sort order, which can't be recomputed on demand.
+    non_evictable = ('sorted_data', 'order')
+
+    def __init__(self, ax, x, y, t, c=None, n_blocks=16, **kwargs):
+
+        if n_blocks < 1 or n_blocks % 1 != 0:
+            raise ValueError('n_blocks should be a strictly positive integer value')
+
+        self._n_blocks = int(n_blocks)
+        self._window = None
+        self._window_times = None, None
+        self._block_cache = None
+
+        self._set_t(t)
+
+        super(TimeDensityHelper, self).__init__(ax, x, y, c=c, **kwargs)
+
+    def _set_t(self, t):
+        t = np.asarray(t)
+        if np.all(t[:-1] <= t[1:]):
+            # Avoid copying the data if it is already sorted
+            self._order = None
+            self._t = t
+        else:
+            self._order = np.argsort(t, kind='stable')
+            self._t = t[self._order]
+
+    def _sort(self, values):
+        if values is None or self._order is None:
+            return values
+        return np.asarray(values)[self._order]
+
+    def set_xy(self, x, y, t=None):
+        """
+        Set the coordinates of the points and optionally their times. If
+        ``t`` is not specified, the points should be in the same order as
+        the times given previously. If the times are changed, ``c`` should
+        also be set again with :meth:`set_c`.
+        """
+        if t is not None:
+            self._set_t(t)
+            self._update_window()
+        if len(x) != len(self._t) or len(y) != len(self._t):
+            raise ValueError('x, y and t should have the same length')
+        self._block_cache = None
+        super(TimeDensityHelper, self).set_xy(self._sort(x), self._sort(y))
+
+    def set_c(self, c):
+        self._block_cache = None
+        if isinstance(c, dict):
+            c = {key: self._sort(values) for key, values in c.items()}
+        else:
+            c = self._sort(c)
+        super(TimeDensityHelper, self).set_c(c)
+
+    def set_time_window(self, t0=None, t1=None):
+        """
+        Only show points with times in the ``[t0, t1)`` interval. If either
+        limit is `None`, the window is unbounded on that side.
+        """
+        self.version += 1
+        self._window_times = t0, t1
+        self._update_window()
+
+    def _update_window(self):
+        # Find the slice of the sorted data corresponding to the window
+        t0, t1 = self._window_times
+        if t0 is None and t1 is None:
+            self._window = None
+        else:
+            start = 0 if t0 is None else int(np.searchsorted(self._t, t0, side='left'))
+            end = len(self._t) if t1 is None else int(np.searchsorted(self._t, t1, side='left'))
+            self._window = start, max(start, end)
+
+    def memory_usage(self):
+        usage = super(TimeDensityHelper, self).memory_usage()
+        if self._block_cache is None:
+            usage['block_cache'] = 0
+        else:
+            usage['block_cache'] = nbytes(self._block_cache[1]) + nbytes(self._block_cache[2])
+        if self._order is None:
+            usage['sorted_data'] = usage['order'] = 0
+        else:
+            if self._columns is None:
+                values = [self._c]
+            else:
+                values = self._columns.values()
+            usage['sorted_data'] = (nbytes(self._t) + nbytes(self._x) + nbytes(self._y) +
+                                    sum(nbytes(array) for array in values))
+            usage['order'] = nbytes(self._order)
+        return usage
+
+    def evict(self, name):
+        if name == 'block_cache':
+            self._block_cache = None
+        else:
+            super(TimeDensityHelper, self).evict(name)
+
+    def _view_key(self):
+        return super(TimeDensityHelper, self)._view_key() + (self._window,)
+
+    def _window_slice(self):
+        start, end = self._window
+        if self._downres:
+            # The subsets used when panning contain every step-th point, so
+            # we need the elements with indices in the window.
+            step = self._downres_factor ** 2
+            return -(-start // step), -(-end // step)
+        return start, end
+
+    def _compute(self, x, y, weights, columns, bins, range):
+
+        if self._window is None:
+            return super(TimeDensityHelper, self)._compute(x, y, weights, columns,
+                                                           bins, range)
+
+        start, end = self._window_slice()
+
+        if (self._geometry is None and columns is None and not self._cache_indices and
+                (weights is None or self._reduce == 'mean')):
+            return self._block_array(x, y, weights, bins, range, start, end)
+
+        if weights is not None:
+            weights = weights[start:end]
+        if columns is not None:
+            columns = {key: values[start:end] for key, values in columns.items()}
+
+        return super(TimeDensityHelper, self)._compute(x[start:end], y[start:end],
+                                                       weights, columns, bins, range)
+
+    def _pixel_index(self, engine, x, y, bins, range):
+        # Cached pixel indices are for the points in the window only
+        if self._window is None:
+            return super(TimeDensityHelper, self)._pixel_index(engine, x, y, bins, range)
+        else:
+            return engine.bin_index(x, y, bins=bins, range=range)
+
+    def _selection_result(self, mask, count):
+        # Only points inside the time window are selected, and the indices
+        # should refer to the original order of the points.
+        if self._window is not None:
+            start, end = self._window
+            mask[:start] = False
+            mask[end:] = False
+        if count or self._order is None:
+            return super(TimeDensityHelper, self)._selection_result(mask, count)
+        else:
+            indices = super(TimeDensityHelper, self)._selection_result(mask, count)
+            return np.sort(self._order[indices])
+
+    def _block_edges(self, n):
+        # The blocks only depend on the number of points (which differs
+        # between the full data and the subsets used when panning), not on
+        # the view.
+        return np.linspace(0, n, self._n_blocks + 1).astype(int)
+
+    def _block_histograms(self, engine, x, y, weights, bins, range, edges):
+
+        # The cumulative histograms of the blocks only depend on the view and
+        # not on the time window, so we cache them for the last view.
+
+        key = (bins, range, weights is None) + super(TimeDensityHelper, self)._view_key()
+
+        if self._block_cache is not None and self._block_cache[0] == key:
+            return self._block_cache[1:]
+
+        cumulative = np.zeros((len(edges),) + bins)
+        if weights is not None:
+            cumulative_sum = np.zeros((len(edges),) + bins)
+        else:
+            cumulative_sum = None
+
+        for i in np.arange(self._n_blocks):
+            i0, i1 = edges[i], edges[i + 1]
+            cumulative[i + 1] = cumulative[i] + engine.histogram2d(x[i0:i1], y[i0:i1],
+                                                                   bins=bins, range=range)
+            if weights is not None:
+                cumulative_sum[i + 1] = (cumulative_sum[i] +
+                                         engine.histogram2d(x[i0:i1], y[i0:i1], bins=bins,
+                                                            range=range,
+                                                            weights=weights[i0:i1]))
+
+        self._block_cache = key, cumulative, cumulative_sum
+
+        return cumulative, cumulative_sum
+
+    def _block_array(self, x, y, weights, bins, range, start, end):
+
+        # Find the blocks that are entirely inside the window
+        edges = self._block_edges(len(x))
+        b0 = np.searchsorted(edges, start, side='left')
+        b1 = np.searchsorted(edges, end, side='right') - 1
+
+        if b0 >= b1:
+            # The window does not contain any whole block, so it is cheaper to
+            # bin the points directly than to compute the block histograms.
+            slices = [(start, end)]
+            engine = get_engine(self._engine, end - start)
+            count = np.zeros(bins)
+            total = None if weights is None else np.zeros(bins)
+        else:
+            slices = [(start, edges[b0]), (edges[b1], end)]
+            engine = get_engine(self._engine, len(x))
+            cumulative, cumulative_sum = self._block_histograms(engine, x, y, weights,
+                                                                bins, range, edges)
+            count = cumulative[b1] - cumulative[b0]
+            total = None if weights is None else cumulative_sum[b1] - cumulative_sum[b0]
+
+        # Add the points from the partial blocks at the edges of the window
+        for i0, i1 in slices:
+            if i1 > i0:
+                count += engine.histogram2d(x[i0:i1], y[i0:i1], bins=bins, range=range)
+                if weights is not None:
+                    total += engine.histogram2d(x[i0:i1], y[i0:i1], bins=bins,
+                                                range=range, weights=weights[i0:i1])
+
+        if weights is None:
+            return count
+
+        with np.errstate(invalid='ignore'):
+            return total / count
@@ -0,0 +1,56 @@
+from matplotlib.backend_bases import TimerBase
+
+__all__ = ['new_timer', 'Debouncer']
+
+
+def new_timer(canvas, interval):
+    """
+    Return a single-shot timer for ``canvas``, or `None` if the canvas does
+    not provide a working timer.
+
+    Timers provided by interactive canvases call their callbacks from the
+    event loop, in the main thread, so the callbacks can safely modify
+    artists and helpers that might be drawn at the same time.
+    """
+
+    try:
+        timer = canvas.new_timer(interval=interval)
+    except (AttributeError, NotImplementedError):  # pragma: nocover
+        return None
+
+    # Non-interactive canvases return the base timer class, which never
+    # calls its callbacks.
+    if timer is None or type(timer) is TimerBase:
+        return None
+
+    timer.single_shot = True
+
+    return timer
+
+
+class Debouncer:
+    """
+    Coalesce bursts of requests into a single call to a callback.
+
+    Each call to the debouncer (re)starts a timer, and ``callback`` is only
+    called once no new requests have been received for the interval of the
+    timer.
+
+    Parameters
+    ----------
+    timer : `matplotlib.backend_bases.TimerBase`
+        The timer to use, which can be created with :func:`new_timer`.
+    callback : callable
+        The function to call at the end of a burst of requests.
+    """
+
+    def __init__(self, timer, callback):
+        self._timer = timer
+        self._timer.add_callback(callback)
+
+    def __call__(self):
+        self._timer.stop()
+        self._timer.start()
+
+    def stop(self):
+        self._timer.stop()